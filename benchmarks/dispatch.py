@@ -0,0 +1,38 @@
+"""Compare the linear item scan with the indexed dispatch of Menu.select."""
+import timeit
+
+from navmenu.actions import MessageAction
+from navmenu.contents import Content
+from navmenu.item_contents import TextItemContent
+from navmenu.items import BaseItem, Item
+from navmenu.menus import Menu
+
+NUMBER = 10000
+
+
+def linear_select(menu, action, payload=None):
+    target_item = next((
+        i for i in menu.items if (isinstance(i, BaseItem) and i.name == action and i.is_available(payload))
+    ), None)
+
+    return target_item.on_select(payload)
+
+
+def main():
+    for size in (10, 100, 1000):
+        menu = Menu(Content('menu'), [
+            Item(f'item_{i}', TextItemContent(f'item {i}'), MessageAction(f'message {i}')) for i in range(size)
+        ])
+        action = f'item_{size - 1}'
+
+        linear = timeit.timeit(lambda: linear_select(menu, action), number=NUMBER)
+        indexed = timeit.timeit(lambda: menu.select(action), number=NUMBER)
+
+        print(
+            f'{size:>5} items: linear {linear / NUMBER * 1e6:8.2f} us, '
+            f'indexed {indexed / NUMBER * 1e6:8.2f} us, x{linear / indexed:.1f}'
+        )
+
+
+if __name__ == '__main__':
+    main()
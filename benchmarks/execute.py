@@ -0,0 +1,33 @@
+"""Compare ExecuteAction evaluation strategies with an equivalent FunctionAction."""
+import timeit
+
+from navmenu.actions import ExecuteAction, FunctionAction
+from navmenu.contents import Content
+from navmenu.responses import Message
+
+NUMBER = 20000
+COMMAND = 'f"{payload[\'user_id\']} has {payload[\'count\'] * 2} points"'
+
+
+def uncached_process(command, payload):
+    return Message(Content(text=str(eval(command))), payload=payload)
+
+
+def main():
+    payload = {'user_id': 123, 'count': 21}
+    cached = ExecuteAction(COMMAND, return_text=True)
+    safe = ExecuteAction(COMMAND, return_text=True, safe=True)
+    function = FunctionAction(lambda x: Message(Content(text=f'{x["user_id"]} has {x["count"] * 2} points')))
+
+    for name, func in (
+        ('uncached eval', lambda: uncached_process(COMMAND, payload)),
+        ('cached code', lambda: cached.process(payload)),
+        ('safe closure', lambda: safe.process(payload)),
+        ('function', lambda: function.process(payload)),
+    ):
+        seconds = timeit.timeit(func, number=NUMBER)
+        print(f'{name:>13}: {seconds / NUMBER * 1e6:7.2f} us')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""Compare per-render time and allocations of the uncompiled and compiled Menu.get_message."""
+import timeit
+import tracemalloc
+
+from navmenu.contents import Content
+from navmenu.item_contents import TextItemContent
+from navmenu.items import Item, LineBreakItem
+from navmenu.keyboard import Keyboard, KeyboardButton
+from navmenu.menus import Menu
+from navmenu.responses import Message
+
+NUMBER = 10000
+SIZE = 20
+
+
+def uncompiled_get_message(menu, payload=None):
+    if payload is None:
+        payload = {}
+
+    keyboard = Keyboard()
+    for item in menu.items:
+        if item.is_available(payload):
+            kwargs = item.get_content()
+
+            if kwargs['type'] == 'button':
+                keyboard.add_button(KeyboardButton(
+                    kwargs['payload'],
+                    kwargs['text'].format(**payload),
+                    kwargs['color'],
+                ))
+
+            elif kwargs['type'] == 'line_break':
+                keyboard.add_line()
+
+    return Message(menu.content, keyboard, payload)
+
+
+def allocated_blocks(func):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    res = [func() for _ in range(100)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    del res
+    return sum(i.count_diff for i in after.compare_to(before, 'filename')) / 100
+
+
+def main():
+    items = []
+    for i in range(SIZE):
+        items.append(Item(f'item_{i}', TextItemContent(f'item {i}')))
+        if i % 4 == 3:
+            items.append(LineBreakItem())
+
+    menu = Menu(Content('menu'), items)
+    payload = {'user_id': 123}
+
+    for name, func in (
+        ('uncompiled', lambda: uncompiled_get_message(menu, payload)),
+        ('compiled', lambda: menu.get_message(payload)),
+    ):
+        seconds = timeit.timeit(func, number=NUMBER)
+        print(f'{name:>10}: {seconds / NUMBER * 1e6:7.2f} us, {allocated_blocks(func):6.1f} retained blocks per render')
+
+
+if __name__ == '__main__':
+    main()
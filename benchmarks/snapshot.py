@@ -0,0 +1,67 @@
+"""Compare MemoryStateHandler snapshots with pickle: file size, load time and peak memory while loading."""
+import os
+import pickle
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from navmenu.state import MemoryStateHandler
+
+MENUS = [f'menu_{i}' for i in range(300)]
+
+
+def load_snapshot(path):
+    MemoryStateHandler('main_menu').load(path)
+
+
+def load_pickle(path):
+    with open(path, 'rb') as f:
+        pickle.load(f)
+
+
+def measure(name, path):
+    func = globals()[name]
+
+    start = time.perf_counter()
+    func(path)
+    seconds = time.perf_counter() - start
+
+    tracemalloc.start()
+    func(path)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    print(f'{name:>13}: {os.path.getsize(path) / 2 ** 20:7.1f} MiB file, {seconds:5.2f} s, peak {peak / 2 ** 20:7.1f} MiB')
+
+
+def main(users):
+    rng = random.Random(0)
+    state_handler = MemoryStateHandler('main_menu')
+    for user_id in range(users):
+        for _ in range(rng.randrange(4)):
+            state_handler.set(user_id, rng.choice(MENUS))
+
+    with tempfile.TemporaryDirectory() as directory:
+        snapshot_path = os.path.join(directory, 'state.snapshot')
+        pickle_path = os.path.join(directory, 'state.pickle')
+
+        state_handler.dump(snapshot_path)
+        with open(pickle_path, 'wb') as f:
+            pickle.dump((state_handler.state, state_handler.history), f, pickle.HIGHEST_PROTOCOL)
+
+        del state_handler
+
+        print(f'{users} users')
+        for name, path in (('load_snapshot', snapshot_path), ('load_pickle', pickle_path)):
+            # Each format is loaded in a fresh process, so the measurements do not affect each other
+            subprocess.run((sys.executable, __file__, 'measure', name, path), check=True)
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['measure']:
+        measure(*sys.argv[2:])
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
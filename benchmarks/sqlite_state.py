@@ -0,0 +1,38 @@
+"""Measure sustained SQLiteStateHandler updates per second for different batch sizes."""
+import os
+import random
+import tempfile
+import time
+
+from navmenu.state import SQLiteStateHandler
+
+UPDATES = 50000
+USERS = 5000
+MENUS = [f'menu_{i}' for i in range(20)]
+
+
+def run(batch_size):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'state.sqlite3')
+        rng = random.Random(0)
+
+        with SQLiteStateHandler('main_menu', path, batch_size=batch_size) as state_handler:
+            start = time.perf_counter()
+            for _ in range(UPDATES):
+                user_id = rng.randrange(USERS)
+                if rng.random() < 0.2:
+                    state_handler.go_back(user_id)
+                else:
+                    state_handler.set(user_id, rng.choice(MENUS))
+
+            state_handler.flush()
+            return UPDATES / (time.perf_counter() - start)
+
+
+def main():
+    for batch_size in (1, 10, 100, 1000):
+        print(f'batch size {batch_size:>4}: {run(batch_size):10.0f} updates/s')
+
+
+if __name__ == '__main__':
+    main()
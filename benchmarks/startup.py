@@ -0,0 +1,79 @@
+"""Compare menu loading from JSON with loading from a precompiled bundle."""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from navmenu.bundle import compile_bundle, load_bundle
+from navmenu.deserializer import deserialize
+
+MENU_COUNT = 400
+ITEMS_PER_MENU = 100
+
+
+def generate_menus():
+    menus = {}
+    for i in range(MENU_COUNT):
+        items = []
+        for j in range(ITEMS_PER_MENU):
+            items.append({
+                'type': 'Item',
+                'name': f'item_{j}',
+                'action': {'type': 'SubmenuAction', 'menu_name': f'menu_{(i + j) % MENU_COUNT}'},
+                'content': {'type': 'TextItemContent', 'text': f'Item {j}'},
+            })
+
+            if j % 10 == 9:
+                items.append({
+                    'type': 'ConditionalItem',
+                    'name': f'admin_{j}',
+                    'action': {'type': 'ExecuteAction', 'command': 'payload["user_id"]', 'return_text': True},
+                    'content': {'type': 'TextItemContent', 'text': 'Admin'},
+                    'condition': 'lambda x: x.get("role") == "admin"',
+                })
+
+        menus[f'menu_{i}'] = {
+            'type': 'Menu',
+            'content': {'type': 'Content', 'text': f'Menu {i}'},
+            'items': items,
+        }
+
+    return {'menus': menus}
+
+
+def load_json(source_path):
+    with open(source_path) as f:
+        deserialize(json.load(f))
+
+
+def measure(name, source_path):
+    func = {'json': load_json, 'bundle': load_bundle}[name]
+
+    start = time.perf_counter()
+    func(source_path)
+    print(f'{name:>7}: {time.perf_counter() - start:6.3f} s')
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        source_path = os.path.join(directory, 'menu.json')
+        with open(source_path, 'w') as f:
+            json.dump(generate_menus(), f)
+
+        start = time.perf_counter()
+        compile_bundle(source_path)
+        compile_seconds = time.perf_counter() - start
+
+        print(f'{MENU_COUNT * ITEMS_PER_MENU * 11 // 10} items, bundle compiled once in {compile_seconds:.3f} s')
+        for name in ('json', 'bundle'):
+            # Every measurement runs in a fresh process, like a starting worker
+            subprocess.run((sys.executable, __file__, 'measure', name, source_path), check=True)
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['measure']:
+        measure(*sys.argv[2:])
+    else:
+        main()
@@ -27,10 +27,15 @@ def handle_messages(messages):
 
 
 def callback_query(call):
-    res = io.process(call.from_user.id, None, json.loads(call.data))
+    res = io.process(call.from_user.id, None, io.decode_callback_data(call.data))
     bot.answer_callback_query(call.id)
     for res_message in res:
-        reply(call.message, res_message.text, res_message.keyboard)
+        if res_message.edit:
+            bot.edit_message_text(
+                res_message.text, call.message.chat.id, call.message.message_id, reply_markup=res_message.keyboard,
+            )
+        else:
+            reply(call.message, res_message.text, res_message.keyboard)
 
 
 def main():
@@ -40,7 +45,7 @@ def main():
         menus = deserialize(json.load(f), __import__(__name__))
 
     menu_manager = MenuManager(menus, MemoryStateHandler('main_menu'))
-    io = TelegramIO(menu_manager)
+    io = TelegramIO(menu_manager, compact_callback_data=True, edit_in_place=True)
 
     bot = telebot.TeleBot(TOKEN)
     bot.set_update_listener(handle_messages)
@@ -1,4 +1,5 @@
 import json
+import logging
 from vk_api import VkApi
 from vk_api.bot_longpoll import VkBotEventType, VkBotLongPoll
 from vk_api.utils import get_random_id
@@ -6,7 +7,7 @@ from vk_api.utils import get_random_id
 from navmenu import MenuManager
 from navmenu.contents import Content
 from navmenu.deserializer import deserialize
-from navmenu.io import VKIO
+from navmenu.io import KeyedDispatcher, VKIO
 from navmenu.responses import Message, Response
 from navmenu.state import MemoryStateHandler
 
@@ -25,6 +26,16 @@ def send(peer_id, text, keyboard):
     })
 
 
+def process(io, msg, payload):
+    for message in io.process(msg['from_id'], msg['text'], payload, msg['peer_id']):
+        send(msg['peer_id'], message.text, message.keyboard)
+
+
+def log_exception(future):
+    if not future.cancelled() and future.exception() is not None:
+        logging.error('Failed to process a message', exc_info=future.exception())
+
+
 def main():
     global vk
 
@@ -37,6 +48,8 @@ def main():
     vk = VkApi(token=TOKEN)
     lp = VkBotLongPoll(vk, GROUP_ID)
 
+    dispatcher = KeyedDispatcher(max_workers=8)
+
     print('Bot started')
 
     while True:
@@ -46,9 +59,8 @@ def main():
 
                 payload = json.loads(msg['payload']) if 'payload' in msg else {}
 
-                res = io.process(msg['from_id'], msg['text'], payload)
-                for message in res:
-                    send(msg['peer_id'], message.text, message.keyboard)
+                future = dispatcher.submit(msg['from_id'], process, io, msg, payload)
+                future.add_done_callback(log_exception)
 
 
 if __name__ == '__main__':
@@ -1,4 +1,4 @@
-from .menu_manager import MenuManager
+from .menu_manager import AsyncMenuManager, MenuManager
 
-__all__ = 'MenuManager',
+__all__ = 'AsyncMenuManager', 'MenuManager',
 __version__ = '0.3.0'
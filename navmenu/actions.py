@@ -1,9 +1,14 @@
+import functools
+import inspect
 from abc import ABC, abstractmethod
 from typing import Any, Dict, Optional, Union
 
 from .contents import Content
+from .expressions import compile_expression
 from .responses import Message, Response
 
+_compile_command = functools.lru_cache(maxsize=4096)(compile)
+
 
 class Action(ABC):
     """A generic action. Every action must inherit from this class and override its methods."""
@@ -22,6 +27,17 @@ class Action(ABC):
         """
         pass
 
+    async def process_async(self, payload: Optional[dict] = None) -> Union[Message, Response]:
+        """Process the payload asynchronously and return a response. By default, calls :meth:`process`.
+
+        Args:
+            payload: An incoming message payload.
+
+        Returns:
+            A message or a response object.
+        """
+        return self.process(payload)
+
     @abstractmethod
     def serialize(self) -> dict:
         """Serialize the class instance to a dictionary.
@@ -84,7 +100,7 @@ class GoBackAction(Action):
     """An action that returns user to the one of previous menus.
 
     Args:
-        count: How many times to go back.
+        count: How many times to go back. -1 returns to the default menu.
     """
 
     __slots__ = 'count',
@@ -110,25 +126,43 @@ class GoBackAction(Action):
 class ExecuteAction(Action):
     """An action that executes a code and optionally returns a message with the result.
 
+    The code is compiled once on creation. It can access the incoming payload as ``payload``.
+
     Args:
         command: The code to execute.
         return_text: Whether to return result as a message with text.
+        safe: Whether to compile the command as a restricted expression with
+            :func:`~navmenu.expressions.compile_expression` instead of running arbitrary code.
     """
 
-    __slots__ = 'command', 'return_text'
+    __slots__ = 'command', 'return_text', 'safe', '_code', '_function'
 
-    def __init__(self, command: str, return_text: bool = False) -> None:
+    def __init__(self, command: str, return_text: bool = False, safe: bool = False) -> None:
         self.command = command
         self.return_text = return_text
+        self.safe = safe
+
+        self._code = None
+        self._function = None
+        if safe:
+            self._function = compile_expression(command)
+        else:
+            self._code = _compile_command(command, '<ExecuteAction>', 'eval' if return_text else 'exec')
 
     def __repr__(self) -> str:
-        return f'ExecuteAction({repr(self.command)}, {self.return_text})'
+        return f'ExecuteAction({repr(self.command)}, {self.return_text}, {self.safe})'
+
+    def __reduce__(self) -> tuple:
+        return self.__class__, (self.command, self.return_text, self.safe)
 
     def process(self, payload: Optional[dict] = None) -> Optional[Message]:
-        if self.return_text:
-            return Message(Content(text=str(eval(self.command))), payload=payload)
+        if self._function is not None:
+            res = self._function(payload)
         else:
-            exec(self.command)
+            res = eval(self._code, globals(), {'self': self, 'payload': payload})
+
+        if self.return_text:
+            return Message(Content(text=str(res)), payload=payload)
 
     def serialize(self) -> dict:
         res = {
@@ -138,12 +172,19 @@ class ExecuteAction(Action):
         if self.return_text is not False:
             res['return_text'] = self.return_text
 
+        if self.safe is not False:
+            res['safe'] = self.safe
+
         return res
 
 
 class FunctionAction(Action):
     """An action that runs a function and optionally returns a response.
 
+    The function may be a coroutine function, in which case the action must be processed with :meth:`process_async`.
+    Templates are never modified: every call returns a view of the template bound to the payload, so the action can
+    be processed from multiple threads.
+
     Args:
         function: The function to run.
         templates: The response templates.
@@ -165,16 +206,24 @@ class FunctionAction(Action):
         if payload is None:
             payload = {}
 
+        return self._get_response(self.function(payload), payload)
+
+    async def process_async(self, payload: Optional[dict] = None) -> Union[Message, Response]:
+        if payload is None:
+            payload = {}
+
         func_res = self.function(payload)
+        if inspect.isawaitable(func_res):
+            func_res = await func_res
+
+        return self._get_response(func_res, payload)
 
+    def _get_response(self, func_res, payload: dict) -> Union[Message, Response]:
         if func_res in self.templates:
-            res = self.templates[func_res]
-            res.update_payload(payload)
-            return res
+            return self.templates[func_res].with_payload(payload)
 
         else:
-            func_res.update_payload(payload)
-            return func_res
+            return func_res.with_payload(payload)
 
     def serialize(self) -> dict:
         res = {
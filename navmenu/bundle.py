@@ -0,0 +1,149 @@
+import hashlib
+import io
+import json
+import os
+import pickle
+import struct
+import tempfile
+import types
+from typing import Dict, Optional, Sequence, Tuple
+
+from . import __version__
+from .deserializer import deserialize
+from .menus import BaseMenu
+
+_BUNDLE_MAGIC = b'NMBUNDL\x02'
+_BUNDLE_HEADER = struct.Struct('<8s16s32s')
+_BUNDLE_VERSION = __version__.encode('ascii')
+
+
+class _BundlePickler(pickle.Pickler):
+    def __init__(self, file, function_container: Optional[types.ModuleType], custom_menu_handlers: Sequence) -> None:
+        super().__init__(file, pickle.HIGHEST_PROTOCOL)
+
+        self.function_container = function_container
+        self.custom_menu_handlers = custom_menu_handlers
+
+    def persistent_id(self, obj) -> Optional[Tuple[str, str]]:
+        if isinstance(obj, type):
+            if any(obj is i for i in self.custom_menu_handlers):
+                return 'handler', obj.__name__
+
+        elif isinstance(obj, types.FunctionType) and self.function_container is not None:
+            if getattr(self.function_container, obj.__name__, None) is obj:
+                return 'function', obj.__name__
+
+        return None
+
+
+class _BundleUnpickler(pickle.Unpickler):
+    def __init__(self, file, function_container: Optional[types.ModuleType], custom_menu_handlers: Sequence) -> None:
+        super().__init__(file)
+
+        self.function_container = function_container
+        self.custom_menu_handlers = custom_menu_handlers
+
+    def persistent_load(self, pid: Tuple[str, str]):
+        kind, name = pid
+
+        if kind == 'function':
+            return getattr(self.function_container, name)
+
+        return next(i for i in self.custom_menu_handlers if i.__name__ == name)
+
+
+def _hash_file(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).digest()
+
+
+def compile_bundle(
+        source_path: str,
+        bundle_path: Optional[str] = None,
+        function_container: types.ModuleType = None,
+        custom_menu_handlers: Sequence = None,
+) -> Dict[str, BaseMenu]:
+    """Deserialize a JSON menu file and save the result to a bundle that loads faster.
+
+    Functions and custom menu handlers are stored by name and bound again on load.
+
+    Args:
+        source_path: The JSON menu file path.
+        bundle_path: The bundle file path. Defaults to the source path with a ".bundle" suffix.
+        function_container: A module that contains custom functions to be called by actions.
+        custom_menu_handlers: A sequence of custom classes to control menus.
+
+    Returns:
+        A dictionary mapping menu names to menus.
+    """
+    if bundle_path is None:
+        bundle_path = source_path + '.bundle'
+
+    if custom_menu_handlers is None:
+        custom_menu_handlers = ()
+
+    with open(source_path, 'rb') as f:
+        source = f.read()
+
+    menus = deserialize(json.loads(source.decode('utf-8')), function_container, custom_menu_handlers)
+
+    buffer = io.BytesIO()
+    buffer.write(_BUNDLE_HEADER.pack(_BUNDLE_MAGIC, _BUNDLE_VERSION, hashlib.sha256(source).digest()))
+    _BundlePickler(buffer, function_container, custom_menu_handlers).dump(menus)
+
+    # Several processes may compile the same bundle, so it is replaced atomically
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(bundle_path)))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(buffer.getvalue())
+
+        os.replace(temp_path, bundle_path)
+
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+    return menus
+
+
+def load_bundle(
+        source_path: str,
+        bundle_path: Optional[str] = None,
+        function_container: types.ModuleType = None,
+        custom_menu_handlers: Sequence = None,
+) -> Dict[str, BaseMenu]:
+    """Load menus from a bundle, compiling it first if it is missing or was built from another version of the source.
+
+    Bundles built by another navmenu version and bundles that cannot be unpickled, for example because they are
+    truncated or refer to renamed functions, are compiled again as well.
+
+    Args:
+        source_path: The JSON menu file path.
+        bundle_path: The bundle file path. Defaults to the source path with a ".bundle" suffix.
+        function_container: A module that contains custom functions to be called by actions.
+        custom_menu_handlers: A sequence of custom classes to control menus.
+
+    Returns:
+        A dictionary mapping menu names to menus.
+    """
+    if bundle_path is None:
+        bundle_path = source_path + '.bundle'
+
+    if custom_menu_handlers is None:
+        custom_menu_handlers = ()
+
+    try:
+        with open(bundle_path, 'rb') as f:
+            magic, version, source_hash = _BUNDLE_HEADER.unpack(f.read(_BUNDLE_HEADER.size))
+
+            if (
+                magic == _BUNDLE_MAGIC and version.rstrip(b'\0') == _BUNDLE_VERSION
+                and source_hash == _hash_file(source_path)
+            ):
+                return _BundleUnpickler(f, function_container, custom_menu_handlers).load()
+
+    # A missing or stale bundle may fail to load in many ways, and it is rebuilt from the source in every case
+    except Exception:
+        pass
+
+    return compile_bundle(source_path, bundle_path, function_container, custom_menu_handlers)
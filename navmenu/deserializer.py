@@ -1,5 +1,8 @@
+import collections.abc
+import threading
+from collections import OrderedDict
 from types import ModuleType
-from typing import Optional, Sequence
+from typing import Iterator, Mapping, Optional, Sequence, Tuple
 
 from . import actions
 from . import contents
@@ -24,9 +27,9 @@ def deserialize_action(data: dict, function_container: ModuleType):
         if 'templates' in data:
             for template in data['templates']:
                 if 'message' in template:
-                    template['message'] = getattr(responses, template['message']['type'])(
+                    template = {**template, 'message': getattr(responses, template['message']['type'])(
                         **filter_kwargs(template['message'])
-                    )
+                    )}
 
                 templates[template['case']] = getattr(responses, template['type'])(
                     **filter_kwargs(template, ('case', ))
@@ -65,11 +68,11 @@ def deserialize_content(data: dict):
 def deserialize_menu(data: dict, function_container: ModuleType, custom_menu_handlers):
     class_ = getattr(menus, data['type'])
 
-    if 'items' in data:
+    if 'handler' not in data:
         return class_(
             **filter_kwargs(data, ('content', 'items', 'default_action')),
             content=deserialize_content(data['content']),
-            items=[deserialize_item(i, function_container) for i in data['items']],
+            items=[deserialize_item(i, function_container) for i in data.get('items', ())],
             default_action=(
                 deserialize_action(data['default_action'], function_container) if 'default_action' in data else None
             ),
@@ -97,3 +100,123 @@ def deserialize(data: dict, function_container: ModuleType = None, custom_menu_h
         menu_name: deserialize_menu(menu, function_container, custom_menu_handlers)
         for menu_name, menu in data['menus'].items()
     }
+
+
+class LazyMenus(collections.abc.MutableMapping):
+    """A mapping of menu names to menus that deserializes each menu on first access.
+
+    It can be passed to :class:`~navmenu.menu_manager.MenuManager` instead of a dictionary. Menu aliases are read
+    from the raw data, so building the alias index does not build the menus.
+
+    Args:
+        data: Data to deserialize.
+        function_container: A module that contains custom functions to be called by actions.
+        custom_menu_handlers: A sequence of custom classes to control menus.
+        max_loaded: The maximum number of built menus to keep. The least recently used ones are evicted and built
+            again on the next access, so changes made to them at runtime are lost. Menus added with item assignment
+            are never evicted.
+    """
+
+    def __init__(
+            self,
+            data: dict,
+            function_container: ModuleType = None,
+            custom_menu_handlers: Sequence = None,
+            max_loaded: Optional[int] = None,
+    ) -> None:
+        self.definitions = dict(data['menus'])
+        self.function_container = function_container
+        self.custom_menu_handlers = custom_menu_handlers
+        self.max_loaded = max_loaded
+
+        self._loaded = OrderedDict()
+        self._added = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f'LazyMenus({len(self)} menus, {len(self._loaded)} loaded)'
+
+    def __getitem__(self, menu_name: str) -> menus.BaseMenu:
+        if menu_name in self._added:
+            return self._added[menu_name]
+
+        with self._lock:
+            menu = self._loaded.get(menu_name)
+            if menu is not None:
+                self._loaded.move_to_end(menu_name)
+                return menu
+
+            menu = deserialize_menu(self.definitions[menu_name], self.function_container, self.custom_menu_handlers)
+
+            self._loaded[menu_name] = menu
+            if self.max_loaded is not None and len(self._loaded) > self.max_loaded:
+                self._loaded.popitem(last=False)
+
+            return menu
+
+    def __setitem__(self, menu_name: str, menu: menus.BaseMenu) -> None:
+        with self._lock:
+            self.definitions.pop(menu_name, None)
+            self._loaded.pop(menu_name, None)
+            self._added[menu_name] = menu
+
+    def __delitem__(self, menu_name: str) -> None:
+        if menu_name not in self:
+            raise KeyError(menu_name)
+
+        with self._lock:
+            self.definitions.pop(menu_name, None)
+            self._loaded.pop(menu_name, None)
+            self._added.pop(menu_name, None)
+
+    def __contains__(self, menu_name) -> bool:
+        return menu_name in self.definitions or menu_name in self._added
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self.definitions
+        yield from self._added
+
+    def __len__(self) -> int:
+        return len(self.definitions) + len(self._added)
+
+    @property
+    def loaded_count(self) -> int:
+        """The number of menus that are currently built."""
+        return len(self._loaded) + len(self._added)
+
+    def loaded_names(self) -> Sequence[str]:
+        """Get the names of the menus built from the definitions.
+
+        Returns:
+            A list of menu names.
+        """
+        with self._lock:
+            return list(self._loaded)
+
+    def preload(self, built_menus: Mapping[str, menus.BaseMenu]) -> None:
+        """Store already built menus so that they are not built again on access.
+
+        Unlike item assignment, the menus keep their definitions and may be evicted.
+
+        Args:
+            built_menus: A mapping of menu names to menus built from the current definitions.
+        """
+        with self._lock:
+            for menu_name, menu in built_menus.items():
+                if menu_name in self.definitions:
+                    self._loaded[menu_name] = menu
+
+            while self.max_loaded is not None and len(self._loaded) > self.max_loaded:
+                self._loaded.popitem(last=False)
+
+    def iter_aliases(self) -> Iterator[Tuple[str, Sequence[str]]]:
+        """Iterate over menu names and their aliases without building the menus.
+
+        Returns:
+            An iterator of menu names and alias sequences.
+        """
+        for menu_name, definition in self.definitions.items():
+            yield menu_name, definition.get('aliases', ())
+
+        for menu_name, menu in self._added.items():
+            yield menu_name, menu.aliases
@@ -0,0 +1,248 @@
+import ast
+import sys
+from typing import Callable, Optional, Sequence, Union
+
+SAFE_FUNCTIONS = {
+    'abs': abs,
+    'bool': bool,
+    'float': float,
+    'int': int,
+    'len': len,
+    'max': max,
+    'min': min,
+    'round': round,
+    'str': str,
+}
+
+_ALLOWED_NODES = (
+    ast.Expression, ast.Load, ast.Name, ast.Constant, ast.Subscript, ast.Slice,
+    ast.Tuple, ast.List, ast.Set, ast.Dict, ast.JoinedStr, ast.FormattedValue,
+    ast.BoolOp, ast.And, ast.Or,
+    ast.UnaryOp, ast.Not, ast.UAdd, ast.USub, ast.Invert,
+    ast.BinOp, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow,
+    ast.BitAnd, ast.BitOr, ast.BitXor, ast.LShift, ast.RShift,
+    ast.Compare, ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.In, ast.NotIn, ast.Is, ast.IsNot,
+    ast.IfExp, ast.Call,
+)
+
+if sys.version_info < (3, 8):
+    _ALLOWED_NODES += ast.Num, ast.Str, ast.Bytes, ast.NameConstant
+
+if sys.version_info < (3, 9):
+    _ALLOWED_NODES += ast.Index,
+
+_SCOPE_NODES = (ast.Lambda, ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp)
+if sys.version_info >= (3, 8):
+    _SCOPE_NODES += ast.NamedExpr,
+
+_PAYLOAD = '_payload'
+_MISSING = object()
+
+# The maximum length of a repeated sequence and the maximum number of bits of a power or shift result
+MAX_RESULT_SIZE = 10 ** 6
+
+
+def _check_int_bits(bits: int) -> None:
+    if bits > MAX_RESULT_SIZE:
+        raise ValueError('The result of a safe expression is too large')
+
+
+def _safe_pow(a, b):
+    if isinstance(a, int) and isinstance(b, int) and b > 0:
+        _check_int_bits(a.bit_length() * b)
+
+    return a ** b
+
+
+def _safe_mult(a, b):
+    for sequence, count in ((a, b), (b, a)):
+        if isinstance(sequence, (str, bytes, list, tuple)) and isinstance(count, int):
+            if len(sequence) * count > MAX_RESULT_SIZE:
+                raise ValueError('The result of a safe expression is too large')
+
+    return a * b
+
+
+def _safe_lshift(a, b):
+    if isinstance(a, int) and isinstance(b, int):
+        _check_int_bits(a.bit_length() + b)
+
+    return a << b
+
+
+_GUARDED_OPERATORS = {
+    ast.Pow: '_safe_pow',
+    ast.Mult: '_safe_mult',
+    ast.LShift: '_safe_lshift',
+}
+_GUARDS = {
+    '_safe_pow': _safe_pow,
+    '_safe_mult': _safe_mult,
+    '_safe_lshift': _safe_lshift,
+}
+
+
+class _GuardOperators(ast.NodeTransformer):
+    def visit_BinOp(self, node: ast.BinOp) -> ast.AST:
+        self.generic_visit(node)
+
+        name = _GUARDED_OPERATORS.get(type(node.op))
+        if name is None:
+            return node
+
+        return ast.copy_location(ast.Call(
+            func=ast.Name(id=name, ctx=ast.Load()), args=[node.left, node.right], keywords=[],
+        ), node)
+
+
+def _validate(tree: ast.AST, names: Sequence[str]) -> None:
+    for node in ast.walk(tree):
+        if not isinstance(node, _ALLOWED_NODES):
+            raise ValueError(f'{node.__class__.__name__} is not allowed in a safe expression')
+
+        if isinstance(node, ast.Name) and node.id not in names and node.id not in SAFE_FUNCTIONS:
+            raise ValueError(f'Name {repr(node.id)} is not allowed in a safe expression')
+
+        if isinstance(node, ast.Call) and not (isinstance(node.func, ast.Name) and node.func.id in SAFE_FUNCTIONS):
+            raise ValueError('Only calls of safe functions are allowed in a safe expression')
+
+
+def compile_expression(source: str, args: Sequence[str] = ('payload', )) -> Callable:
+    """Compile an expression into a function, allowing only a safe subset of Python.
+
+    The expression may use the arguments, literals, operators, subscripts, conditional expressions, f-strings and
+    calls of the functions in :data:`SAFE_FUNCTIONS`. Attribute access and other names are rejected.
+
+    Powers, sequence repetition and left shifts whose results would exceed :data:`MAX_RESULT_SIZE` raise
+    :class:`ValueError` when evaluated. Other operations are not limited, so for example a large width in a format
+    specification can still take a lot of memory, and expressions from untrusted sources should be avoided.
+
+    Args:
+        source: The expression source code.
+        args: The names of the function arguments.
+
+    Returns:
+        A function that takes the arguments and returns the expression value.
+
+    Raises:
+        SyntaxError: The source is not a valid expression.
+        ValueError: The expression uses a disallowed construct.
+    """
+    tree = ast.parse(source.strip(), mode='eval')
+    _validate(tree, args)
+
+    # The validated tree itself becomes the function body, so the source is never parsed in another context
+    function = ast.parse(f'lambda {", ".join(args)}: None', mode='eval')
+    function.body.body = _GuardOperators().visit(tree.body)
+    code = compile(ast.fix_missing_locations(function), '<expression>', 'eval')
+
+    return eval(code, {'__builtins__': {}, **SAFE_FUNCTIONS, **_GUARDS})
+
+
+class _RenameArgument(ast.NodeTransformer):
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def visit_Name(self, node: ast.Name) -> ast.Name:
+        if node.id == self.name:
+            return ast.copy_location(ast.Name(id=_PAYLOAD, ctx=node.ctx), node)
+
+        return node
+
+
+def _inline_condition(source: str) -> Optional[ast.expr]:
+    try:
+        tree = ast.parse(source.strip(), mode='eval')
+    except SyntaxError:
+        return None
+
+    function = tree.body
+    if not isinstance(function, ast.Lambda):
+        return None
+
+    args = function.args
+    if (
+        len(args.args) != 1 or args.vararg or args.kwarg or args.kwonlyargs or args.defaults
+        or getattr(args, 'posonlyargs', None)
+    ):
+        return None
+
+    # Nested scopes may shadow the argument, so such conditions are called as separate functions
+    if any(isinstance(node, _SCOPE_NODES) for node in ast.walk(function.body)):
+        return None
+
+    return _RenameArgument(args.args[0].arg).visit(function.body)
+
+
+def fuse_conditions(
+        conditions: Sequence[Union[str, Callable]],
+        keys: Optional[Sequence[str]] = None,
+        cache_size: int = 1024,
+) -> Callable[[dict], int]:
+    """Compile conditions into a single function that returns a bitmask of the conditions that hold.
+
+    Conditions given as single-argument lambda sources are inlined into the generated function, and equal conditions
+    are evaluated once. Other conditions are called as functions with the payload.
+
+    Args:
+        conditions: Lambda sources or functions that take the payload and return a boolean.
+        keys: The payload keys the conditions read. If provided, results are cached by the values of these keys.
+        cache_size: The maximum number of cached results.
+
+    Returns:
+        A function that takes the payload and returns an integer with bit ``i`` set if condition ``i`` holds.
+    """
+    module = ast.parse(f'def fused({_PAYLOAD}):\n    mask = 0\n    return mask')
+    function = module.body[0]
+    namespace = {}
+    bits = {}
+    tests = {}
+
+    for i, condition in enumerate(conditions):
+        test = _inline_condition(condition) if isinstance(condition, str) else None
+        key = ast.dump(test) if test is not None else condition
+
+        if key not in bits:
+            if test is None:
+                name = f'_condition_{len(namespace)}'
+                namespace[name] = eval(condition) if isinstance(condition, str) else condition
+                test = ast.parse(f'{name}({_PAYLOAD})', mode='eval').body
+
+            bits[key] = 0
+            tests[key] = test
+
+        bits[key] |= 1 << i
+
+    for key, test in tests.items():
+        statement = ast.parse(f'if _:\n    mask |= {bits[key]}').body[0]
+        statement.test = test
+        function.body.insert(-1, statement)
+
+    code = compile(ast.fix_missing_locations(module), '<conditions>', 'exec')
+    exec(code, namespace)
+    fused = namespace['fused']
+
+    if keys is None:
+        return fused
+
+    keys = tuple(keys)
+    cache = {}
+
+    def cached(payload: dict) -> int:
+        cache_key = tuple(payload.get(k, _MISSING) for k in keys)
+
+        try:
+            return cache[cache_key]
+        except KeyError:
+            pass
+        except TypeError:
+            return fused(payload)
+
+        res = fused(payload)
+        if len(cache) >= cache_size:
+            cache.clear()
+
+        cache[cache_key] = res
+        return res
+
+    return cached
@@ -0,0 +1,138 @@
+from collections import deque
+from typing import Dict, Iterator, Mapping, Optional, Sequence, Tuple
+
+from .actions import Action, FunctionAction, SubmenuAction
+from .menus import BaseMenu, Menu
+from .responses import Response
+
+
+def _iter_action_targets(action: Optional[Action]) -> Iterator[str]:
+    if isinstance(action, SubmenuAction):
+        yield action.menu_name
+
+    elif isinstance(action, FunctionAction):
+        for template in action.templates.values():
+            if isinstance(template, Response) and template.menu is not None:
+                yield template.menu
+
+
+def _iter_menu_targets(menu: BaseMenu) -> Iterator[str]:
+    if not isinstance(menu, Menu):
+        return
+
+    for item in menu.items:
+        yield from _iter_action_targets(getattr(item, 'action', None))
+
+    yield from _iter_action_targets(menu.default_action)
+
+
+class MenuGraph:
+    """A compiled graph of transitions between menus.
+
+    Args:
+        root: The name of the menu new users start in.
+        transitions: A dictionary mapping menu names to tuples of the menu names they can switch to.
+        alias_targets: The names of the menus that can be opened with an alias from any menu.
+        dangling: A tuple of menu name and missing target name pairs.
+
+    Attributes:
+        unreachable: The names of the menus that cannot be reached from the root menu.
+        depths: A dictionary mapping reachable menu names to the minimum number of transitions from the root menu.
+        depth: The maximum of :attr:`depths`.
+        fan_out: A dictionary mapping menu names to the number of menus they can switch to.
+        max_fan_out: The maximum of :attr:`fan_out`.
+    """
+
+    __slots__ = (
+        'root', 'transitions', 'alias_targets', 'dangling', 'unreachable', 'depths', 'depth', 'fan_out', 'max_fan_out',
+    )
+
+    def __init__(
+            self,
+            root: Optional[str],
+            transitions: Dict[str, Tuple[str, ...]],
+            alias_targets: Sequence[str] = (),
+            dangling: Sequence[Tuple[str, str]] = (),
+    ) -> None:
+        self.root = root
+        self.transitions = transitions
+        self.alias_targets = tuple(alias_targets)
+        self.dangling = tuple(dangling)
+
+        self.fan_out = {k: len(v) for k, v in transitions.items()}
+        self.max_fan_out = max(self.fan_out.values(), default=0)
+
+        # Aliases work in every menu, so their targets are one transition away from the root
+        depths = {}
+        queue = deque()
+        if root in transitions:
+            depths[root] = 0
+            queue.append(root)
+
+        for menu_name in self.alias_targets:
+            if menu_name not in depths:
+                depths[menu_name] = 1
+                queue.append(menu_name)
+
+        while queue:
+            menu_name = queue.popleft()
+            for target in transitions[menu_name]:
+                if target in transitions and target not in depths:
+                    depths[target] = depths[menu_name] + 1
+                    queue.append(target)
+
+        self.depths = depths
+        self.depth = max(depths.values(), default=0)
+        self.unreachable = frozenset(transitions).difference(depths)
+
+    def __repr__(self) -> str:
+        return (
+            f'MenuGraph({repr(self.root)}, {len(self.transitions)} menus, depth {self.depth}, '
+            f'max fan-out {self.max_fan_out}, {len(self.dangling)} dangling, {len(self.unreachable)} unreachable)'
+        )
+
+    def validate(self) -> None:
+        """Check that every transition refers to an existing menu.
+
+        Raises:
+            ValueError: A transition refers to a missing menu.
+        """
+        if self.dangling:
+            raise ValueError('Transitions refer to missing menus: ' + ', '.join(
+                f'{repr(menu_name)} -> {repr(target)}' for menu_name, target in self.dangling
+            ))
+
+
+def compile_graph(
+        menus: Mapping[str, BaseMenu],
+        root: Optional[str] = None,
+        aliases: Optional[Mapping[str, str]] = None,
+) -> MenuGraph:
+    """Collect transitions between menus and check them.
+
+    Transitions are read from :class:`~navmenu.actions.SubmenuAction` actions and from the response templates of
+    :class:`~navmenu.actions.FunctionAction` actions. Transitions made by functions outside of templates and by
+    custom menus cannot be known in advance, so custom menus are treated as having no transitions.
+
+    Every menu is built, so :class:`~navmenu.deserializer.LazyMenus` mappings lose their laziness.
+
+    Args:
+        menus: A mapping of menu names to menus.
+        root: The name of the menu new users start in.
+        aliases: A dictionary mapping aliases to menu names.
+
+    Returns:
+        The compiled graph.
+    """
+    transitions = {}
+    dangling = []
+
+    for menu_name, menu in menus.items():
+        targets = dict.fromkeys(_iter_menu_targets(menu))
+        transitions[menu_name] = tuple(targets)
+
+        dangling += ((menu_name, target) for target in targets if target not in menus)
+
+    alias_targets = dict.fromkeys(aliases.values()) if aliases else ()
+
+    return MenuGraph(root, transitions, alias_targets, dangling)
@@ -1,6 +1,10 @@
-from navmenu.io.base import BaseIO
+from navmenu.io.base import BaseIO, KeyboardCache, KeyboardTracker
 from navmenu.io.console import ConsoleIO
-from navmenu.io.telegram import TelegramIO
+from navmenu.io.dispatcher import KeyedDispatcher
+from navmenu.io.telegram import CallbackDataCodec, TelegramIO
 from navmenu.io.vk import VKIO
 
-__all__ = 'BaseIO', 'ConsoleIO', 'TelegramIO', 'VKIO',
+__all__ = (
+    'BaseIO', 'CallbackDataCodec', 'KeyboardCache', 'KeyboardTracker', 'ConsoleIO', 'KeyedDispatcher', 'TelegramIO',
+    'VKIO',
+)
@@ -1,9 +1,184 @@
+import threading
 from abc import ABC, abstractmethod
-from typing import Any
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Iterable, List, Optional, Sequence
 
+from navmenu.keyboard import Keyboard
 from navmenu.menu_manager import MenuManager
 
 
+class KeyboardCache:
+    """A bounded LRU cache of encoded keyboards.
+
+    Keyboards are identified by a fingerprint of their visible buttons, so equal keyboards are encoded once.
+
+    Args:
+        maxsize: The maximum number of encoded keyboards to keep.
+
+    Attributes:
+        hits: How many times an encoded keyboard was found in the cache.
+        misses: How many times a keyboard had to be encoded.
+    """
+
+    __slots__ = 'maxsize', 'hits', 'misses', '_data', '_lock'
+
+    def __init__(self, maxsize: int = 1024) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f'KeyboardCache({self.maxsize})'
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    @staticmethod
+    def fingerprint(keyboard: Keyboard) -> Hashable:
+        """Get a hashable value identifying the keyboard's buttons.
+
+        Args:
+            keyboard: The keyboard.
+
+        Returns:
+            The keyboard fingerprint.
+        """
+        return tuple(tuple((i.payload, i.text, i.color) for i in line) for line in keyboard.lines)
+
+    def get(self, keyboard: Keyboard, encode: Callable[[Keyboard], str]) -> str:
+        """Get the encoded keyboard, encoding it on a cache miss.
+
+        Args:
+            keyboard: The keyboard to encode.
+            encode: A function that encodes the keyboard.
+
+        Returns:
+            The encoded keyboard.
+        """
+        try:
+            key = self.fingerprint(keyboard)
+            hash(key)
+        except TypeError:
+            self.misses += 1
+            return encode(keyboard)
+
+        with self._lock:
+            res = self._data.get(key)
+            if res is not None:
+                self.hits += 1
+                self._data.move_to_end(key)
+                return res
+
+            self.misses += 1
+
+        res = encode(keyboard)
+
+        with self._lock:
+            self._data[key] = res
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+        return res
+
+    def clear(self) -> None:
+        """Remove all encoded keyboards and reset the counters."""
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+class KeyboardTracker:
+    """A bounded LRU record of the last keyboard sent to each user.
+
+    Platforms with persistent keyboards keep showing the last keyboard, so an unchanged keyboard does not need to be
+    sent again. Users evicted from the record get their keyboard sent again.
+
+    Args:
+        maxsize: The maximum number of users to remember.
+    """
+
+    __slots__ = 'maxsize', '_data', '_lock'
+
+    def __init__(self, maxsize: int = 65536) -> None:
+        self.maxsize = maxsize
+
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f'KeyboardTracker({self.maxsize})'
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def update(self, user_id: Hashable, keyboard: str) -> bool:
+        """Remember the keyboard as the last one sent to the user.
+
+        Args:
+            user_id: A value used to identify the user.
+            keyboard: The encoded keyboard.
+
+        Returns:
+            True if the keyboard differs from the last one sent to the user.
+        """
+        with self._lock:
+            last = self._data.get(user_id)
+            self._data[user_id] = keyboard
+            self._data.move_to_end(user_id)
+
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+        # Cached keyboards are shared, so the identity check usually avoids comparing the strings
+        return last is not keyboard and last != keyboard
+
+    def forget(self, user_id: Hashable) -> None:
+        """Forget the last keyboard sent to the user, so that the next one is sent.
+
+        Args:
+            user_id: A value used to identify the user.
+        """
+        with self._lock:
+            self._data.pop(user_id, None)
+
+
+def coalesce_messages(messages: Sequence[Any], separator: str = '\n\n', max_length: Optional[int] = None) -> List[Any]:
+    """Merge consecutive outgoing messages into as few messages as possible.
+
+    Texts are joined with the separator and only the last keyboard is kept. A message that would make the merged text
+    longer than the limit starts a new message. The messages are modified in place.
+
+    Args:
+        messages: Platform messages with "text" and "keyboard" attributes.
+        separator: The string inserted between merged texts.
+        max_length: The maximum text length allowed by the platform.
+
+    Returns:
+        A list of merged messages.
+    """
+    res = []
+
+    for message in messages:
+        if res:
+            last = res[-1]
+            text = last.text + separator + message.text if last.text and message.text else last.text or message.text
+
+            if max_length is None or len(text) <= max_length:
+                last.text = text
+                if message.keyboard is not None:
+                    last.keyboard = message.keyboard
+
+                continue
+
+        res.append(message)
+
+    return res
+
+
 class BaseIO(ABC):
     """A class that processes incoming messages and responds to them.
 
@@ -20,3 +195,47 @@ class BaseIO(ABC):
     def process(self, *args: Any, **kwargs: Any) -> Any:
         """Process the message and return a response."""
         pass
+
+
+class BatchProcessingMixin:
+    """A mixin for IO classes whose ``process`` method takes the user ID as the first argument."""
+
+    __slots__ = ()
+
+    def process_batch(self, events: Iterable[Sequence[Any]], return_exceptions: bool = False) -> List[Any]:
+        """Process a batch of messages, such as a long poll response, and return a response to each of them.
+
+        The states of all users are prefetched in one state handler call, the messages are processed in order and
+        pending changes are flushed once at the end.
+
+        Args:
+            events: Sequences of ``process`` arguments starting with the user ID.
+            return_exceptions: Whether to put the errors raised while processing messages into the results instead
+                of raising them, so that the other messages still get their responses.
+
+        Returns:
+            A list of responses, one for every message.
+
+        Raises:
+            Exception: A message could not be processed and return_exceptions is False.
+        """
+        events = list(events)
+        state_handler = self.menu_manager.state_handler
+        state_handler.prefetch(i[0] for i in events)
+
+        res = []
+        try:
+            for event in events:
+                try:
+                    res.append(self.process(*event))
+
+                except Exception as e:
+                    if not return_exceptions:
+                        raise
+
+                    res.append(e)
+
+            return res
+
+        finally:
+            state_handler.flush()
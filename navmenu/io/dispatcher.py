@@ -0,0 +1,136 @@
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Hashable, Optional
+
+
+class KeyedDispatcher:
+    """Runs tasks in a thread pool, keeping tasks with the same key in submission order.
+
+    Tasks with different keys, such as messages from different users, run in parallel, while tasks with the same key
+    never overlap. The state handler used by the tasks must be thread-safe.
+
+    Args:
+        max_workers: The maximum number of worker threads.
+        max_pending: The maximum number of submitted tasks that have not finished yet.
+    """
+
+    __slots__ = 'max_pending', '_executor', '_semaphore', '_lock', '_queues', '_is_shutdown'
+
+    def __init__(self, max_workers: Optional[int] = None, max_pending: int = 1000) -> None:
+        self.max_pending = max_pending
+
+        self._executor = ThreadPoolExecutor(max_workers)
+        self._semaphore = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._queues = {}
+        self._is_shutdown = False
+
+    def __repr__(self) -> str:
+        return f'KeyedDispatcher({self._executor._max_workers}, {self.max_pending})'
+
+    def __enter__(self) -> 'KeyedDispatcher':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.shutdown()
+
+    def submit(
+            self, key: Hashable, function: Callable, *args: Any, block: bool = True, timeout: Optional[float] = None,
+            **kwargs: Any,
+    ) -> Future:
+        """Schedule the function to run after all previously submitted tasks with the same key.
+
+        If the number of pending tasks has reached the limit, waits until one of them finishes.
+
+        Args:
+            key: A value used to order tasks, usually the user ID.
+            function: The function to run.
+            *args: Positional arguments for the function.
+            block: Whether to wait for a free slot when the limit is reached.
+            timeout: How many seconds to wait for a free slot.
+            **kwargs: Keyword arguments for the function.
+
+        Returns:
+            A future representing the function result.
+
+        Raises:
+            queue.Full: The pending task limit was reached and no slot became free.
+            RuntimeError: The dispatcher was shut down.
+        """
+        if not self._semaphore.acquire(block, timeout):
+            raise queue.Full('Too many pending tasks')
+
+        future = Future()
+
+        with self._lock:
+            if self._is_shutdown:
+                self._semaphore.release()
+                raise RuntimeError('Cannot submit tasks after shutdown')
+
+            tasks = self._queues.get(key)
+            is_idle = tasks is None
+            if is_idle:
+                tasks = self._queues[key] = deque()
+
+            tasks.append((future, function, args, kwargs))
+
+            # Scheduled under the lock, so shutdown cannot close the executor in between
+            if is_idle:
+                self._executor.submit(self._run_next, key)
+
+        return future
+
+    def _run_next(self, key: Hashable) -> None:
+        with self._lock:
+            tasks = self._queues[key]
+            future, function, args, kwargs = tasks[0]
+
+        if future.set_running_or_notify_cancel():
+            try:
+                future.set_result(function(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+
+        self._semaphore.release()
+
+        with self._lock:
+            tasks.popleft()
+            if not tasks or self._is_shutdown:
+                self._cancel(tasks)
+                del self._queues[key]
+                return
+
+            # Other keys get a chance to run before the next task with this key
+            self._executor.submit(self._run_next, key)
+
+    def _cancel(self, tasks: deque, keep: int = 0) -> None:
+        while len(tasks) > keep:
+            future = tasks.pop()[0]
+            future.cancel()
+            self._semaphore.release()
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop accepting tasks and optionally wait for the pending ones.
+
+        If not waiting, tasks that have not started yet are cancelled.
+
+        Args:
+            wait: Whether to wait until all pending tasks finish.
+        """
+        if wait:
+            for _ in range(self.max_pending):
+                self._semaphore.acquire()
+
+            for _ in range(self.max_pending):
+                self._semaphore.release()
+
+        with self._lock:
+            self._is_shutdown = True
+
+            # The first task of every key is already scheduled in the executor and runs or is cancelled there
+            for tasks in self._queues.values():
+                self._cancel(tasks, keep=1)
+
+        self._executor.shutdown(wait)
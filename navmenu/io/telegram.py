@@ -1,30 +1,190 @@
+import base64
+import hashlib
 import json
-from typing import Optional, Sequence
+import threading
+from collections import OrderedDict
+from typing import Any, Optional, Sequence
 
-from navmenu.io.base import BaseIO
+from navmenu.deserializer import LazyMenus
+from navmenu.io.base import BaseIO, BatchProcessingMixin, KeyboardCache, coalesce_messages
 from navmenu.keyboard import Keyboard
 from navmenu.menu_manager import MenuManager
+from navmenu.menus import Menu
 from navmenu.responses import Message
 
+CALLBACK_DATA_LIMIT = 64
+MAX_TEXT_LENGTH = 4096
+
+_INLINE_PREFIX = '/'
+_TOKEN_PREFIX = '#'
+_MISSING = object()
+
+
+class CallbackDataCodec:
+    """Encodes button payloads into compact callback data and decodes them back without JSON.
+
+    String payloads that fit into the callback data limit are sent after a one-character prefix. Other payloads are
+    replaced with a 12-character token derived from their hash and stored in a table. Tokens of registered payloads
+    are kept forever, while the others are kept in a bounded LRU table, so a button with an evicted token decodes
+    to nothing.
+
+    Args:
+        maxsize: The maximum number of unregistered payload tokens to keep.
+    """
+
+    __slots__ = 'maxsize', '_registered', '_registered_names', '_tokens', '_lock'
+
+    def __init__(self, maxsize: int = 65536) -> None:
+        self.maxsize = maxsize
+
+        self._registered = {}
+        self._registered_names = set()
+        self._tokens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f'CallbackDataCodec({self.maxsize})'
+
+    @staticmethod
+    def _make_token(payload: Any) -> str:
+        if isinstance(payload, str):
+            key = b's' + payload.encode('utf-8')
+        else:
+            key = b'j' + json.dumps(payload, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+        return _TOKEN_PREFIX + base64.urlsafe_b64encode(hashlib.blake2b(key, digest_size=9).digest()).decode('ascii')
+
+    def register(self, payload: Any) -> str:
+        """Encode the payload and keep its token forever.
+
+        Args:
+            payload: The button payload.
+
+        Returns:
+            The callback data.
+        """
+        data = self.encode(payload)
+        if data.startswith(_TOKEN_PREFIX):
+            with self._lock:
+                self._registered[data] = payload
+
+                if isinstance(payload, str):
+                    self._registered_names.add(payload)
+
+        return data
+
+    def is_persistent(self, payload: Any) -> bool:
+        """Check whether the callback data of the payload can always be decoded.
+
+        Args:
+            payload: The button payload.
+
+        Returns:
+            True if the payload is sent as is or its token was registered.
+        """
+        if not isinstance(payload, str):
+            return False
+
+        return len(payload.encode('utf-8')) < CALLBACK_DATA_LIMIT or payload in self._registered_names
+
+    def encode(self, payload: Any) -> str:
+        """Encode the button payload.
+
+        Args:
+            payload: The button payload.
+
+        Returns:
+            The callback data.
+        """
+        if isinstance(payload, str) and len(payload.encode('utf-8')) < CALLBACK_DATA_LIMIT:
+            return _INLINE_PREFIX + payload
+
+        token = self._make_token(payload)
+
+        with self._lock:
+            if token not in self._registered:
+                self._tokens[token] = payload
+                self._tokens.move_to_end(token)
+
+                if len(self._tokens) > self.maxsize:
+                    self._tokens.popitem(last=False)
+
+        return token
+
+    def decode(self, data: str) -> Optional[dict]:
+        """Decode the callback data into an incoming message payload.
+
+        JSON callback data of keyboards sent without the codec is decoded as well.
+
+        Args:
+            data: The callback data.
+
+        Returns:
+            The incoming message payload, or None if the token is unknown.
+        """
+        if data.startswith(_INLINE_PREFIX):
+            return {'a': data[1:]}
+
+        if data.startswith(_TOKEN_PREFIX):
+            payload = self._registered.get(data, self._tokens.get(data, _MISSING))
+            if payload is _MISSING:
+                return None
+
+            return {'a': payload}
+
+        return json.loads(data)
+
 
 class TelegramMessage:
-    def __init__(self, text: Optional[str] = '', keyboard: Optional[Keyboard] = None) -> None:
+    def __init__(
+            self,
+            text: Optional[str] = '',
+            keyboard: Optional[Keyboard] = None,
+            keyboard_cache: Optional[KeyboardCache] = None,
+            callback_data_codec: Optional[CallbackDataCodec] = None,
+            edit: bool = False,
+    ) -> None:
         self.text = text
+        self.callback_data_codec = callback_data_codec
+        self.edit = edit
 
-        self.rows = []
+        self._rows = []
         self.keyboard = None
         if keyboard is not None:
-            self.keyboard = self.format_keyboard(keyboard)
+            if keyboard_cache is None or not self._is_cacheable(keyboard):
+                self.keyboard = self.format_keyboard(keyboard)
+            else:
+                self.keyboard = keyboard_cache.get(keyboard, self.format_keyboard)
+
+    def _is_cacheable(self, keyboard: Keyboard) -> bool:
+        # Cache hits skip encoding, so tokens that may expire would never be refreshed in the codec table
+        if self.callback_data_codec is None:
+            return True
+
+        return all(self.callback_data_codec.is_persistent(i.payload) for line in keyboard.lines for i in line)
+
+    @property
+    def rows(self) -> list:
+        """The keyboard button rows, decoded from :attr:`keyboard` so that they do not depend on the keyboard cache."""
+        if self.keyboard is None:
+            return []
+
+        return json.loads(self.keyboard)['inline_keyboard']
 
     def add_keyboard_button(self, payload: dict, text: str) -> None:
-        self.rows[-1].append({
+        if self.callback_data_codec is None:
+            callback_data = json.dumps(payload, ensure_ascii=False, separators=(',', ':'))
+        else:
+            callback_data = self.callback_data_codec.encode(payload['a'])
+
+        self._rows[-1].append({
             'text': text,
-            'callback_data': json.dumps(payload, ensure_ascii=False, separators=(',', ':')),
+            'callback_data': callback_data,
         })
 
     def format_keyboard(self, keyboard: Keyboard) -> str:
         for row in keyboard.lines:
-            self.rows.append([])
+            self._rows.append([])
 
             for button in row:
                 payload = {'a': button.payload}
@@ -32,20 +192,64 @@ class TelegramMessage:
                 self.add_keyboard_button(payload, button.text)
 
         return json.dumps({
-            'inline_keyboard': self.rows,
+            'inline_keyboard': self._rows,
         }, ensure_ascii=False, separators=(',', ':'))
 
 
-def format_message(message: Message) -> TelegramMessage:
+def format_message(
+        message: Message,
+        keyboard_cache: Optional[KeyboardCache] = None,
+        callback_data_codec: Optional[CallbackDataCodec] = None,
+) -> TelegramMessage:
     content = message.get_content()
 
-    return TelegramMessage(content.get('text', ''), message.keyboard)
+    return TelegramMessage(content.get('text', ''), message.keyboard, keyboard_cache, callback_data_codec)
 
 
-class TelegramIO(BaseIO):
-    def __init__(self, menu_manager: MenuManager) -> None:
+class TelegramIO(BatchProcessingMixin, BaseIO):
+    def __init__(
+            self,
+            menu_manager: MenuManager,
+            keyboard_cache_size: int = 1024,
+            compact_callback_data: bool = False,
+            coalesce: bool = False,
+            separator: str = '\n\n',
+            edit_in_place: bool = False,
+    ) -> None:
         super().__init__(menu_manager)
 
+        self.keyboard_cache = KeyboardCache(keyboard_cache_size) if keyboard_cache_size > 0 else None
+        self.coalesce = coalesce
+        self.separator = separator
+        self.edit_in_place = edit_in_place
+        self.callback_data_codec = None
+
+        if compact_callback_data:
+            self.callback_data_codec = CallbackDataCodec()
+
+            # Item names are known in advance, so their tokens survive restarts and never expire
+            if not isinstance(menu_manager.menus, LazyMenus):
+                for menu in menu_manager.menus.values():
+                    if isinstance(menu, Menu):
+                        for item in menu.items:
+                            if item.name is not None:
+                                self.callback_data_codec.register(item.name)
+
+    def decode_callback_data(self, data: str) -> dict:
+        """Decode the callback data of a pressed button into an incoming message payload.
+
+        Args:
+            data: The callback data.
+
+        Returns:
+            The incoming message payload. It is empty if the button token has expired.
+        """
+        if self.callback_data_codec is None:
+            return json.loads(data)
+
+        res = self.callback_data_codec.decode(data)
+        return {} if res is None else res
+
     def process(self, user_id: int, text: Optional[str], payload: dict) -> Sequence[TelegramMessage]:
         res = []
 
@@ -57,26 +261,42 @@ class TelegramIO(BaseIO):
             'text': text,
         }
 
-        if self.menu_manager.state_handler.create(user_id):
+        # A new user or a button that cannot be decoded anymore gets the current menu again
+        if self.menu_manager.state_handler.create(user_id) or action is None:
             return format_message(
-                self.menu_manager.get_message(user_id=user_id, payload=final_payload)
+                self.menu_manager.get_message(user_id=user_id, payload=final_payload),
+                self.keyboard_cache,
+                self.callback_data_codec,
             ),
 
         current_state = self.menu_manager.state_handler.get(user_id)
 
         try:
-            messages = self.menu_manager.select(action, user_id=user_id, payload=final_payload)
+            messages, new_state = self.menu_manager.select_transition(
+                action, user_id=user_id, payload=final_payload, state=current_state,
+            )
 
         except ValueError:
             return TelegramMessage('Invalid command'),
 
         else:
-            res += [format_message(i) for i in messages]
+            res += [format_message(i, self.keyboard_cache, self.callback_data_codec) for i in messages]
 
-        new_state = self.menu_manager.state_handler.get(user_id)
+        edit = False
         if current_state != new_state:
-            message = self.menu_manager.get_message(user_id=user_id, payload=final_payload)
+            message = self.menu_manager.get_message(user_id=user_id, payload=final_payload, state=new_state)
+
+            res.append(format_message(message, self.keyboard_cache, self.callback_data_codec))
+
+            # A button press comes from the previous menu message, which can be edited if the content type is the same
+            if self.edit_in_place and 'a' in payload and message.keyboard is not None:
+                previous_content = getattr(self.menu_manager.menus.get(current_state), 'content', None)
+                edit = previous_content is not None and type(previous_content) is type(message.content)
+
+        if self.coalesce:
+            res = coalesce_messages(res, self.separator, MAX_TEXT_LENGTH)
 
-            res.append(format_message(message))
+        if edit:
+            next(i for i in reversed(res) if i.keyboard is not None).edit = True
 
         return res
@@ -1,12 +1,14 @@
 import json
 from typing import Optional, Sequence
 
-from navmenu.io.base import BaseIO
+from navmenu.io.base import BaseIO, BatchProcessingMixin, KeyboardCache, KeyboardTracker, coalesce_messages
 from navmenu.keyboard import ButtonColors, Keyboard
 from navmenu.menu_manager import MenuManager
 from navmenu.responses import Message
 
 
+MAX_TEXT_LENGTH = 4096
+
 VK_BUTTON_COLORS = {
     ButtonColors.DEFAULT: 'default',
     ButtonColors.PRIMARY: 'primary',
@@ -16,16 +18,32 @@ VK_BUTTON_COLORS = {
 
 
 class VKMessage:
-    def __init__(self, text: Optional[str] = '', keyboard: Optional[Keyboard] = None) -> None:
+    def __init__(
+            self,
+            text: Optional[str] = '',
+            keyboard: Optional[Keyboard] = None,
+            keyboard_cache: Optional[KeyboardCache] = None,
+    ) -> None:
         self.text = text
 
-        self.rows = []
+        self._rows = []
         self.keyboard = None
         if keyboard is not None:
-            self.keyboard = self.format_keyboard(keyboard)
+            if keyboard_cache is None:
+                self.keyboard = self.format_keyboard(keyboard)
+            else:
+                self.keyboard = keyboard_cache.get(keyboard, self.format_keyboard)
+
+    @property
+    def rows(self) -> list:
+        """The keyboard button rows, decoded from :attr:`keyboard` so that they do not depend on the keyboard cache."""
+        if self.keyboard is None:
+            return []
+
+        return json.loads(self.keyboard)['buttons']
 
     def add_keyboard_button(self, payload: dict, text: str, color: int) -> None:
-        self.rows[-1].append({
+        self._rows[-1].append({
             'color': VK_BUTTON_COLORS[color],
             'action': {
                 'type': 'text',
@@ -36,7 +54,7 @@ class VKMessage:
 
     def format_keyboard(self, keyboard: Keyboard) -> str:
         for row in keyboard.lines:
-            self.rows.append([])
+            self._rows.append([])
 
             for button in row:
                 payload = {'a': button.payload}
@@ -46,21 +64,61 @@ class VKMessage:
         return json.dumps({
             'one_time': False,
             'inline': False,
-            'buttons': self.rows,
+            'buttons': self._rows,
         }, ensure_ascii=False, separators=(',', ':'))
 
 
-def format_message(message: Message) -> VKMessage:
+def format_message(message: Message, keyboard_cache: Optional[KeyboardCache] = None) -> VKMessage:
     content = message.get_content()
 
-    return VKMessage(content.get('text', ''), message.keyboard)
+    return VKMessage(content.get('text', ''), message.keyboard, keyboard_cache)
 
 
-class VKIO(BaseIO):
-    def __init__(self, menu_manager: MenuManager) -> None:
+class VKIO(BatchProcessingMixin, BaseIO):
+    def __init__(
+            self,
+            menu_manager: MenuManager,
+            keyboard_cache_size: int = 1024,
+            coalesce: bool = False,
+            separator: str = '\n\n',
+            keyboard_tracker_size: int = 0,
+    ) -> None:
         super().__init__(menu_manager)
 
-    def process(self, user_id: int, text: str, payload: dict) -> Sequence[VKMessage]:
+        self.keyboard_cache = KeyboardCache(keyboard_cache_size) if keyboard_cache_size > 0 else None
+        self.coalesce = coalesce
+        self.separator = separator
+        self.keyboard_tracker = KeyboardTracker(keyboard_tracker_size) if keyboard_tracker_size > 0 else None
+
+    def process(self, user_id: int, text: str, payload: dict, peer_id: Optional[int] = None) -> Sequence[VKMessage]:
+        """Process an incoming message and return the messages to send in response.
+
+        Args:
+            user_id: The ID of the user who sent the message.
+            text: The message text.
+            payload: The message payload.
+            peer_id: The ID of the conversation to respond to. Keyboards are tracked per conversation and default to
+                the user's private conversation.
+
+        Returns:
+            A list of messages.
+        """
+        res = self._process(user_id, text, payload)
+
+        if self.coalesce:
+            res = coalesce_messages(res, self.separator, MAX_TEXT_LENGTH)
+
+        # VK keeps showing the last keyboard, so unchanged keyboards are omitted
+        if self.keyboard_tracker is not None:
+            destination = user_id if peer_id is None else peer_id
+
+            for message in res:
+                if message.keyboard is not None and not self.keyboard_tracker.update(destination, message.keyboard):
+                    message.keyboard = None
+
+        return res
+
+    def _process(self, user_id: int, text: str, payload: dict) -> Sequence[VKMessage]:
         res = []
 
         action = payload['a'] if 'a' in payload else text
@@ -73,24 +131,25 @@ class VKIO(BaseIO):
 
         if self.menu_manager.state_handler.create(user_id):
             return format_message(
-                self.menu_manager.get_message(user_id=user_id, payload=final_payload)
+                self.menu_manager.get_message(user_id=user_id, payload=final_payload), self.keyboard_cache
             ),
 
         current_state = self.menu_manager.state_handler.get(user_id)
 
         try:
-            messages = self.menu_manager.select(action, user_id=user_id, payload=final_payload)
+            messages, new_state = self.menu_manager.select_transition(
+                action, user_id=user_id, payload=final_payload, state=current_state,
+            )
 
         except ValueError:
             return VKMessage('Invalid command'),
 
         else:
-            res += [format_message(i) for i in messages]
+            res += [format_message(i, self.keyboard_cache) for i in messages]
 
-        new_state = self.menu_manager.state_handler.get(user_id)
         if current_state != new_state:
-            message = self.menu_manager.get_message(user_id=user_id, payload=final_payload)
+            message = self.menu_manager.get_message(user_id=user_id, payload=final_payload, state=new_state)
 
-            res.append(format_message(message))
+            res.append(format_message(message, self.keyboard_cache))
 
         return res
@@ -1,11 +1,18 @@
+import functools
 from abc import ABC, abstractmethod
-from typing import Iterator, Optional, Union
+from typing import Iterator, Optional, Sequence, Union
 
 from .actions import Action
 from .item_contents import ItemContent
 from .responses import Message, Response
 
 
+@functools.lru_cache(maxsize=4096)
+def _compile_condition(condition: str):
+    # Conditions are usually repeated across items and menus, and the resulting functions can be shared
+    return eval(condition)
+
+
 class BaseItem(ABC):
     """A generic menu item.
 
@@ -58,6 +65,21 @@ class BaseItem(ABC):
         actions = (self.action, ) if isinstance(self.action, Action) else self.action
         return (action.process(payload) for action in actions)
 
+    async def on_select_async(self, payload: Optional[dict] = None) -> Sequence[Union[Message, Response]]:
+        """Process the payload asynchronously and return actions.
+
+        Args:
+            payload: An incoming message payload.
+
+        Returns:
+            A sequence of responses.
+        """
+        if self.action is None:
+            return ()
+
+        actions = (self.action, ) if isinstance(self.action, Action) else self.action
+        return [await action.process_async(payload) for action in actions]
+
     def serialize(self) -> dict:
         """Serialize the class instance to a dictionary.
 
@@ -133,18 +155,29 @@ class ConditionalItem(Item):
         content: The item content.
         action: The action to execute on item select.
         condition: The condition to check.
+        keys: The payload keys the condition reads. Declaring them allows menus to cache condition results, so the
+            condition must depend on nothing else.
     """
 
-    __slots__ = '_condition_func', 'condition'
+    __slots__ = '_condition_func', 'condition', 'keys'
 
-    def __init__(self, name: str, content: ItemContent, action: Action, condition: str) -> None:
+    def __init__(
+            self, name: str, content: ItemContent, action: Action, condition: str, keys: Optional[Sequence[str]] = None,
+    ) -> None:
         super().__init__(name, content, action)
 
         self.condition = condition
-        self._condition_func = eval(condition)
+        self.keys = keys
+        self._condition_func = _compile_condition(condition)
 
     def __repr__(self) -> str:
-        return f'ConditionalItem({repr(self.name)}, {self.content}, {self.action}, {repr(self.condition)})'
+        return (
+            f'ConditionalItem({repr(self.name)}, {self.content}, {self.action}, {repr(self.condition)}, '
+            f'{self.keys})'
+        )
+
+    def __reduce__(self) -> tuple:
+        return self.__class__, (self.name, self.content, self.action, self.condition, self.keys)
 
     def is_available(self, payload: Optional[dict] = None) -> bool:
         return self._condition_func(payload)
@@ -154,4 +187,7 @@ class ConditionalItem(Item):
 
         res['condition'] = self.condition
 
+        if self.keys is not None:
+            res['keys'] = list(self.keys)
+
         return res
@@ -1,51 +1,303 @@
-from typing import Dict, Optional, Sequence
+import threading
+from types import ModuleType
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple, Union
 
+from .deserializer import LazyMenus, deserialize_menu
+from .graph import MenuGraph, compile_graph
 from .menus import BaseMenu
-from .state import StateHandler
+from .state import AsyncStateHandler, AsyncStateHandlerAdapter, StateHandler, StateTable
 from .responses import Message, Response
 
 
 class MenuManager:
     """A class that manages menus and transitions between them.
 
+    Every menu is assigned a compact integer ID in :attr:`state_table`. If the state handler has its own state table,
+    such as :class:`~navmenu.state.MemoryStateHandler`, it is shared, so the handler stores these IDs.
+
     Args:
-        menus: A dictionary mapping menu names to menus.
+        menus: A dictionary mapping menu names to menus, or a :class:`~navmenu.deserializer.LazyMenus` mapping.
         state_handler: The menu state manager to store users' states.
+
+    Attributes:
+        graph: The graph of transitions between menus, set by :meth:`compile` and :meth:`reload`. It is reset when
+            the menus are replaced or added otherwise.
+
+    Raises:
+        ValueError: Two menus share the same alias.
     """
 
-    __slots__ = 'menus', 'state_handler'
+    __slots__ = '_snapshot', '_definitions', '_remap', '_reload_lock', 'graph', 'state_handler', 'state_table'
 
     def __init__(self, menus: Dict[str, BaseMenu], state_handler: StateHandler) -> None:
-        self.menus = menus
+        state_table = getattr(state_handler, 'state_table', None)
+        if not isinstance(state_table, StateTable):
+            state_table = StateTable()
+
         self.state_handler = state_handler
+        self.state_table = state_table
+        self.menus = menus
+
+        self._remap = {}
+        self._reload_lock = threading.Lock()
 
     def __repr__(self) -> str:
         return f'MenuManager({self.menus}, {self.state_handler})'
 
-    def _switch_menu(self, user_id: int, menu_name: str, payload: dict) -> Sequence[Message]:
+    @property
+    def menus(self) -> Dict[str, BaseMenu]:
+        """A dictionary mapping menu names to menus. Assigning a new dictionary rebuilds the alias index."""
+        return self._snapshot[0]
+
+    @menus.setter
+    def menus(self, menus: Dict[str, BaseMenu]) -> None:
+        for menu_name in menus:
+            self.state_table.get_id(menu_name)
+
+        # Menus and aliases are swapped together, so concurrent calls never see a half-updated graph
+        self._snapshot = menus, self._build_alias_index(menus)
+        self._definitions = menus.definitions if isinstance(menus, LazyMenus) else None
+        self.graph = None
+
+    def get_menu_id(self, menu_name: str) -> int:
+        """Get the integer ID of the menu.
+
+        Args:
+            menu_name: The menu name.
+
+        Returns:
+            The menu ID.
+        """
+        return self.state_table.get_id(menu_name)
+
+    @staticmethod
+    def _build_alias_index(
+            menus: Mapping[str, BaseMenu], aliases: Optional[Dict[str, str]] = None,
+    ) -> Dict[str, str]:
+        if aliases is None:
+            aliases = {}
+
+        # Lazy menu mappings provide aliases without building the menus
+        if hasattr(menus, 'iter_aliases'):
+            menu_aliases = menus.iter_aliases()
+        else:
+            menu_aliases = ((menu_name, menu.aliases) for menu_name, menu in menus.items())
+
+        for menu_name, menu_alias_list in menu_aliases:
+            for alias in menu_alias_list:
+                key = alias.casefold()
+
+                if key in aliases and aliases[key] != menu_name:
+                    raise ValueError(f'Alias {repr(alias)} is used by both {repr(aliases[key])} and {repr(menu_name)}')
+
+                aliases[key] = menu_name
+
+        return aliases
+
+    def add_menu(self, menu_name: str, menu: BaseMenu) -> None:
+        """Add the menu or replace an existing one with the same name.
+
+        Args:
+            menu_name: The menu name.
+            menu: The menu to add.
+
+        Raises:
+            ValueError: The menu alias is already used by another menu.
+        """
+        menus, aliases = self._snapshot
+        aliases = self._build_alias_index({menu_name: menu}, {k: v for k, v in aliases.items() if v != menu_name})
+
+        self.state_table.get_id(menu_name)
+        menus[menu_name] = menu
+        self._snapshot = menus, aliases
+        self.graph = None
+
+        if self._definitions is not None and not isinstance(menus, LazyMenus):
+            self._definitions.pop(menu_name, None)
+
+    def rebuild_aliases(self) -> None:
+        """Rebuild the alias index after menus or their aliases were changed in place.
+
+        Raises:
+            ValueError: Two menus share the same alias.
+        """
+        menus = self._snapshot[0]
+        self._snapshot = menus, self._build_alias_index(menus)
+
+    def compile(self) -> MenuGraph:
+        """Build the graph of transitions between menus and check that every transition refers to an existing menu.
+
+        The state handler's default state is used as the root menu. Once compiled, :meth:`reload` checks new
+        definitions the same way before switching to them.
+
+        Returns:
+            The compiled graph, also stored in :attr:`graph`.
+
+        Raises:
+            ValueError: A transition refers to a missing menu.
+        """
+        menus, aliases = self._snapshot
+
+        graph = compile_graph(menus, getattr(self.state_handler, 'default_state', None), aliases)
+        graph.validate()
+
+        self.graph = graph
+        return graph
+
+    def reload(
+            self,
+            data: dict,
+            function_container: ModuleType = None,
+            custom_menu_handlers: Sequence = None,
+            remap: Optional[Dict[str, str]] = None,
+    ) -> Dict[str, list]:
+        """Replace the menus with new definitions, rebuilding only the menus whose definitions changed.
+
+        The new menus are swapped in atomically. Users whose current or previous menu was removed are moved to
+        the replacement menu the next time they are processed.
+
+        Added and changed menus are built before the swap, so invalid definitions raise an exception and leave the
+        current menus in place.
+
+        The definitions of the current menus are known if they were loaded with :class:`LazyMenus` or by a
+        previous reload. Otherwise, the current menus are serialized once to compare them.
+
+        Args:
+            data: Data to deserialize, in the format accepted by :func:`~navmenu.deserializer.deserialize`.
+            function_container: A module that contains custom functions to be called by actions. Defaults to the
+                one of the current :class:`LazyMenus` mapping.
+            custom_menu_handlers: A sequence of custom classes to control menus. Defaults to the ones of the current
+                :class:`LazyMenus` mapping.
+            remap: A dictionary mapping removed menu names to replacement menu names. By default, users are moved
+                to the state handler's default state.
+
+        Returns:
+            A dictionary with lists of added, changed and removed menu names.
+
+        Raises:
+            ValueError: Two menus share the same alias, a remap target is not one of the new menus, or the menus
+                were compiled and a new transition refers to a missing menu.
+            Exception: A definition cannot be deserialized.
+        """
+        if remap is None:
+            remap = {}
+
+        with self._reload_lock:
+            old_menus = self._snapshot[0]
+            old_definitions = self._definitions
+            if old_definitions is None:
+                old_definitions = {k: {'type': v.__class__.__name__, **v.serialize()} for k, v in old_menus.items()}
+
+            new_definitions = dict(data['menus'])
+            added = [k for k in new_definitions if k not in old_definitions]
+            removed = [k for k in old_menus if k not in new_definitions]
+            changed = [
+                k for k, v in new_definitions.items()
+                if k in old_definitions and old_definitions[k] is not v and old_definitions[k] != v
+            ]
+
+            rebuilt = set(added) | set(changed)
+
+            if isinstance(old_menus, LazyMenus):
+                if function_container is None:
+                    function_container = old_menus.function_container
+                if custom_menu_handlers is None:
+                    custom_menu_handlers = old_menus.custom_menu_handlers
+
+                menus = LazyMenus(data, function_container, custom_menu_handlers, old_menus.max_loaded)
+
+                # Rebuilt menus are deserialized now, so broken definitions are rejected before the swap
+                built = {
+                    k: deserialize_menu(new_definitions[k], function_container, custom_menu_handlers) for k in rebuilt
+                }
+                built.update({
+                    k: old_menus[k] for k in old_menus.loaded_names() if k in new_definitions and k not in rebuilt
+                })
+                menus.preload(built)
+
+            else:
+                menus = {k: (
+                    deserialize_menu(v, function_container, custom_menu_handlers) if k in rebuilt else old_menus[k]
+                ) for k, v in new_definitions.items()}
+
+            missing = [v for v in remap.values() if v not in new_definitions]
+            if missing:
+                raise ValueError('Remap targets refer to missing menus: ' + ', '.join(map(repr, missing)))
+
+            aliases = self._build_alias_index(menus)
+
+            graph = None
+            if self.graph is not None:
+                graph = compile_graph(menus, self.graph.root, aliases)
+                graph.validate()
+
+            for menu_name in menus:
+                self.state_table.get_id(menu_name)
+
+            default_state = getattr(self.state_handler, 'default_state', None)
+            new_remap = {menu_name: remap.get(menu_name, default_state) for menu_name in removed}
+
+            # Earlier replacements that were just removed are resolved, so chains of remaps end in an existing menu
+            for menu_name, replacement in self._remap.items():
+                if menu_name not in new_definitions:
+                    new_remap.setdefault(menu_name, new_remap.get(replacement, replacement))
+
+            self._snapshot = menus, aliases
+            self._definitions = menus.definitions if isinstance(menus, LazyMenus) else new_definitions
+            self._remap = new_remap
+            if graph is not None:
+                self.graph = graph
+
+        return {
+            'added': added,
+            'changed': changed,
+            'removed': removed,
+        }
+
+    def _get_state(self, user_id: int, menus: Mapping[str, BaseMenu], state: Optional[str] = None) -> str:
+        if state is None:
+            state = self.state_handler.get(user_id)
+
+        if state not in menus:
+            replacement = self._remap.get(state)
+            if replacement is not None:
+                self.state_handler.set(user_id, replacement)
+                state = replacement
+
+        return state
+
+    def _switch_menu(
+            self, user_id: int, menu_name: str, payload: dict, menus: Mapping[str, BaseMenu],
+    ) -> Sequence[Message]:
         self.state_handler.set(user_id, menu_name)
 
-        enter_res = self.menus[menu_name].enter(payload)
+        enter_res = menus[menu_name].enter(payload)
         if isinstance(enter_res, Message):
             return enter_res,
         else:
             return ()
 
-    def get_message(self, user_id: int = None, payload: Optional[dict] = None) -> Message:
+    def get_message(
+            self, user_id: int = None, payload: Optional[dict] = None, state: Optional[str] = None,
+    ) -> Message:
         """Get a message representing the current menu.
 
         Args:
             user_id: A value used to identify the user.
             payload: An incoming message payload.
+            state: The current state of the user if it is already known, to avoid reading it again.
 
         Returns:
             A message representing the current menu.
         """
-        state = self.state_handler.get(user_id)
+        menus = self._snapshot[0]
+        state = self._get_state(user_id, menus, state)
 
-        return self.menus[state].get_message(payload)
+        return menus[state].get_message(payload)
 
-    def select(self, action: str, user_id: int = None, payload: Optional[dict] = None) -> Sequence[Message]:
+    def select(
+            self, action: str, user_id: int = None, payload: Optional[dict] = None, state: Optional[str] = None,
+    ) -> Sequence[Message]:
         """Select an item in the current menu based on action and payload.
 
         This method handles current menu changes.
@@ -54,6 +306,7 @@ class MenuManager:
             action: A string indicating selected menu button.
             user_id: A value used to identify the user.
             payload: An incoming message payload.
+            state: The current state of the user if it is already known, to avoid reading it again.
 
         Returns:
             A list of messages.
@@ -61,9 +314,31 @@ class MenuManager:
         Raises:
             ValueError: An invalid action was provided.
         """
-        state = self.state_handler.get(user_id)
+        return self.select_transition(action, user_id, payload, state)[0]
+
+    def select_transition(
+            self, action: str, user_id: int = None, payload: Optional[dict] = None, state: Optional[str] = None,
+    ) -> Tuple[Sequence[Message], str]:
+        """Select an item like :meth:`select` and also return the new state of the user.
 
-        actions = self.menus[state].select(action, payload)
+        The new state is tracked during the transition, so it is read from the state handler only after going back.
+
+        Args:
+            action: A string indicating selected menu button.
+            user_id: A value used to identify the user.
+            payload: An incoming message payload.
+            state: The current state of the user if it is already known, to avoid reading it again.
+
+        Returns:
+            A list of messages and the new state.
+
+        Raises:
+            ValueError: An invalid action was provided.
+        """
+        menus, aliases = self._snapshot
+        state = self._get_state(user_id, menus, state)
+
+        actions = menus[state].select(action, payload)
         if actions is not None:
             messages = []
             for res in actions:
@@ -76,19 +351,62 @@ class MenuManager:
 
                     if res.go_back_count:
                         self.state_handler.go_back(user_id, res.go_back_count)
+                        state = None
 
                     if res.menu:
-                        messages += self._switch_menu(user_id, res.menu, payload)
+                        messages += self._switch_menu(user_id, res.menu, payload, menus)
+                        state = res.menu
+
+            if state is None:
+                state = self.state_handler.get(user_id)
 
-            return messages
+            return messages, state
 
         else:
-            for menu_name, menu in self.menus.items():
-                if action.lower() in menu.aliases:
-                    return self._switch_menu(user_id, menu_name, payload)
+            menu_name = aliases.get(action.casefold())
+            if menu_name is not None:
+                return self._switch_menu(user_id, menu_name, payload, menus), menu_name
 
             raise ValueError('An invalid action was provided')
 
+    def select_many(
+            self, events: Iterable[Tuple[str, Optional[int], Optional[dict]]], return_exceptions: bool = False,
+    ) -> List[Union[Sequence[Message], ValueError]]:
+        """Select items for a batch of events, such as a long poll response.
+
+        The states of all users are prefetched in one state handler call, the events are processed in order and
+        pending changes are flushed once at the end.
+
+        Args:
+            events: Tuples of action, user ID and payload, as accepted by :meth:`select`.
+            return_exceptions: Whether to put the errors of invalid actions into the results instead of raising them.
+
+        Returns:
+            A list of message lists, one for every event.
+
+        Raises:
+            ValueError: An invalid action was provided and return_exceptions is False.
+        """
+        events = list(events)
+        self.state_handler.prefetch(user_id for _, user_id, _ in events)
+
+        res = []
+        try:
+            for action, user_id, payload in events:
+                try:
+                    res.append(self.select(action, user_id, payload))
+
+                except ValueError as e:
+                    if not return_exceptions:
+                        raise
+
+                    res.append(e)
+
+        finally:
+            self.state_handler.flush()
+
+        return res
+
     def serialize(self) -> dict:
         """Serialize the class instance to a dictionary.
 
@@ -101,3 +419,182 @@ class MenuManager:
                 **menu.serialize(),
             } for menu_name, menu in self.menus.items()},
         }
+
+
+class AsyncMenuManager(MenuManager):
+    """A menu manager with an asynchronous interface.
+
+    Menus are processed through their async methods, so actions and custom menu handlers may be coroutine functions.
+
+    Args:
+        menus: A dictionary mapping menu names to menus.
+        state_handler: The menu state manager to store users' states. Synchronous state managers are wrapped
+            with :class:`~navmenu.state.AsyncStateHandlerAdapter`.
+
+    Raises:
+        ValueError: Two menus share the same alias.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, menus: Dict[str, BaseMenu], state_handler: Union[AsyncStateHandler, StateHandler]) -> None:
+        if isinstance(state_handler, StateHandler):
+            state_handler = AsyncStateHandlerAdapter(state_handler)
+
+        super().__init__(menus, state_handler)
+
+    def __repr__(self) -> str:
+        return f'AsyncMenuManager({self.menus}, {self.state_handler})'
+
+    async def _get_state(self, user_id: int, menus: Mapping[str, BaseMenu], state: Optional[str] = None) -> str:
+        if state is None:
+            state = await self.state_handler.get(user_id)
+
+        if state not in menus:
+            replacement = self._remap.get(state)
+            if replacement is not None:
+                await self.state_handler.set(user_id, replacement)
+                state = replacement
+
+        return state
+
+    async def _switch_menu(
+            self, user_id: int, menu_name: str, payload: dict, menus: Mapping[str, BaseMenu],
+    ) -> Sequence[Message]:
+        await self.state_handler.set(user_id, menu_name)
+
+        enter_res = await menus[menu_name].enter_async(payload)
+        if isinstance(enter_res, Message):
+            return enter_res,
+        else:
+            return ()
+
+    async def get_message(
+            self, user_id: int = None, payload: Optional[dict] = None, state: Optional[str] = None,
+    ) -> Message:
+        """Get a message representing the current menu.
+
+        Args:
+            user_id: A value used to identify the user.
+            payload: An incoming message payload.
+            state: The current state of the user if it is already known, to avoid reading it again.
+
+        Returns:
+            A message representing the current menu.
+        """
+        menus = self._snapshot[0]
+        state = await self._get_state(user_id, menus, state)
+
+        return await menus[state].get_message_async(payload)
+
+    async def select(
+            self, action: str, user_id: int = None, payload: Optional[dict] = None, state: Optional[str] = None,
+    ) -> Sequence[Message]:
+        """Select an item in the current menu based on action and payload.
+
+        This method handles current menu changes.
+
+        Args:
+            action: A string indicating selected menu button.
+            user_id: A value used to identify the user.
+            payload: An incoming message payload.
+            state: The current state of the user if it is already known, to avoid reading it again.
+
+        Returns:
+            A list of messages.
+
+        Raises:
+            ValueError: An invalid action was provided.
+        """
+        return (await self.select_transition(action, user_id, payload, state))[0]
+
+    async def select_transition(
+            self, action: str, user_id: int = None, payload: Optional[dict] = None, state: Optional[str] = None,
+    ) -> Tuple[Sequence[Message], str]:
+        """Select an item like :meth:`select` and also return the new state of the user.
+
+        The new state is tracked during the transition, so it is read from the state handler only after going back.
+
+        Args:
+            action: A string indicating selected menu button.
+            user_id: A value used to identify the user.
+            payload: An incoming message payload.
+            state: The current state of the user if it is already known, to avoid reading it again.
+
+        Returns:
+            A list of messages and the new state.
+
+        Raises:
+            ValueError: An invalid action was provided.
+        """
+        menus, aliases = self._snapshot
+        state = await self._get_state(user_id, menus, state)
+
+        actions = await menus[state].select_async(action, payload)
+        if actions is not None:
+            messages = []
+            for res in actions:
+                if isinstance(res, Message):
+                    messages.append(res)
+
+                elif isinstance(res, Response):
+                    if res.message:
+                        messages.append(res.message)
+
+                    if res.go_back_count:
+                        await self.state_handler.go_back(user_id, res.go_back_count)
+                        state = None
+
+                    if res.menu:
+                        messages += await self._switch_menu(user_id, res.menu, payload, menus)
+                        state = res.menu
+
+            if state is None:
+                state = await self.state_handler.get(user_id)
+
+            return messages, state
+
+        else:
+            menu_name = aliases.get(action.casefold())
+            if menu_name is not None:
+                return (await self._switch_menu(user_id, menu_name, payload, menus)), menu_name
+
+            raise ValueError('An invalid action was provided')
+
+    async def select_many(
+            self, events: Iterable[Tuple[str, Optional[int], Optional[dict]]], return_exceptions: bool = False,
+    ) -> List[Union[Sequence[Message], ValueError]]:
+        """Select items for a batch of events, such as a long poll response.
+
+        The states of all users are prefetched in one state handler call, the events are processed in order and
+        pending changes are flushed once at the end.
+
+        Args:
+            events: Tuples of action, user ID and payload, as accepted by :meth:`select`.
+            return_exceptions: Whether to put the errors of invalid actions into the results instead of raising them.
+
+        Returns:
+            A list of message lists, one for every event.
+
+        Raises:
+            ValueError: An invalid action was provided and return_exceptions is False.
+        """
+        events = list(events)
+        await self.state_handler.prefetch(user_id for _, user_id, _ in events)
+
+        res = []
+        try:
+            for action, user_id, payload in events:
+                try:
+                    res.append(await self.select(action, user_id, payload))
+
+                except ValueError as e:
+                    if not return_exceptions:
+                        raise
+
+                    res.append(e)
+
+        finally:
+            await self.state_handler.flush()
+
+        return res
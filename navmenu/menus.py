@@ -1,12 +1,15 @@
 import collections.abc
+import inspect
 from abc import ABC, abstractmethod
-from typing import Iterator, Optional, Sequence
+from typing import Callable, Iterator, Optional, Sequence, Tuple
 
 from .actions import Action
 from .contents import BaseContent
-from .items import BaseItem
+from .expressions import fuse_conditions
+from .items import BaseItem, ConditionalItem
 from .responses import Message
 from .keyboard import KeyboardButton, Keyboard
+from .templates import compile_template
 
 
 class BaseMenu(ABC):
@@ -74,6 +77,40 @@ class BaseMenu(ABC):
         """
         pass
 
+    async def select_async(self, action: str, payload: Optional[dict] = None) -> Optional[Sequence[Message]]:
+        """Asynchronously select an item based on action and payload. By default, calls :meth:`select`.
+
+        Args:
+            action: A string indicating selected menu button.
+            payload: An incoming message payload.
+
+        Returns:
+            None or a list of messages.
+        """
+        return self.select(action, payload)
+
+    async def get_message_async(self, payload: Optional[dict] = None) -> Message:
+        """Asynchronously get a message representing the menu. By default, calls :meth:`get_message`.
+
+        Args:
+            payload: An incoming message payload.
+
+        Returns:
+            A message representing the menu.
+        """
+        return self.get_message(payload)
+
+    async def enter_async(self, payload: Optional[dict] = None) -> Optional[Message]:
+        """Asynchronously enter the menu. By default, calls :meth:`enter`.
+
+        Args:
+            payload: An incoming message payload.
+
+        Returns:
+            None or a message.
+        """
+        return self.enter(payload)
+
 
 class Menu(BaseMenu):
     """A menu with fixed content and list of items.
@@ -85,7 +122,9 @@ class Menu(BaseMenu):
         aliases: A sequence of strings that act as shortcuts to the menu.
     """
 
-    __slots__ = 'content', 'items', 'default_action'
+    __slots__ = (
+        'content', 'items', 'default_action', '_item_index', '_compiled',
+    )
 
     def __init__(
             self,
@@ -103,14 +142,37 @@ class Menu(BaseMenu):
         self.items = items
         self.default_action = default_action
 
+        self._item_index = {}
+        for item in items:
+            self._index_item(item)
+
+        self._compiled = None
+
     def __repr__(self) -> str:
         return f'Menu({self.content}, {self.items}, {repr(self.default_action)}, {self.aliases})'
 
-    def select(self, action: str, payload: Optional[dict] = None) -> Optional[Iterator[Message]]:
-        target_item = next((
-            i for i in self.items if (isinstance(i, BaseItem) and i.name == action and i.is_available(payload))
+    def __getstate__(self) -> dict:
+        # The compiled keyboard contains generated functions, so it is rebuilt after unpickling
+        return {k: getattr(self, k) for k in ('aliases', 'content', 'items', 'default_action', '_item_index')}
+
+    def __setstate__(self, state: dict) -> None:
+        for k, v in state.items():
+            setattr(self, k, v)
+
+        self._compiled = None
+
+    def _index_item(self, item: BaseItem) -> None:
+        if isinstance(item, BaseItem) and item.name is not None:
+            self._item_index.setdefault(item.name, []).append(item)
+
+    def _find_item(self, action: str, payload: Optional[dict]) -> Optional[BaseItem]:
+        return next((
+            i for i in self._item_index.get(action, ()) if i.is_available(payload)
         ), None)
 
+    def select(self, action: str, payload: Optional[dict] = None) -> Optional[Iterator[Message]]:
+        target_item = self._find_item(action, payload)
+
         if target_item is None:
             if self.default_action:
                 return self.default_action.process(payload),
@@ -119,24 +181,107 @@ class Menu(BaseMenu):
 
         return target_item.on_select(payload)
 
+    async def select_async(self, action: str, payload: Optional[dict] = None) -> Optional[Sequence[Message]]:
+        target_item = self._find_item(action, payload)
+
+        if target_item is None:
+            if self.default_action:
+                return await self.default_action.process_async(payload),
+
+            return
+
+        return await target_item.on_select_async(payload)
+
+    def compile(self) -> None:
+        """Precompute the static parts of the menu keyboard.
+
+        Buttons of always available items with constant labels are built once. Item conditions are fused into a
+        single function returning a bitmask of visible items (see :func:`~navmenu.expressions.fuse_conditions`),
+        whose results are cached when every conditional item declares its payload keys. Only the conditions and
+        labels with placeholders are evaluated on every render. If the menu has no such parts, the same keyboard is
+        reused for every message and must not be modified.
+
+        This is done on the first render and after adding an item, but must be called manually if items or
+        their contents are changed in place.
+        """
+        self._compile()
+
+    def _compile(self) -> Tuple[list, Optional[Callable[[dict], int]], Optional[Keyboard]]:
+        entries = []
+        conditions = []
+        keys = set()
+        is_static = True
+
+        for item in self.items:
+            kwargs = item.get_content()
+            if kwargs['type'] not in ('button', 'line_break'):
+                continue
+
+            bit = 0
+            if type(item).is_available is not BaseItem.is_available:
+                bit = 1 << len(conditions)
+                is_static = False
+
+                if isinstance(item, ConditionalItem) and type(item).is_available is ConditionalItem.is_available:
+                    conditions.append(item.condition)
+                else:
+                    conditions.append(item.is_available)
+
+                if keys is not None and isinstance(item, ConditionalItem) and item.keys is not None:
+                    keys.update(item.keys)
+                else:
+                    keys = None
+
+            if kwargs['type'] == 'line_break':
+                entries.append((bit, None, None))
+                continue
+
+            template = compile_template(kwargs['text'])
+            if template.is_constant:
+                entries.append((bit, KeyboardButton(kwargs['payload'], template.render(), kwargs['color']), None))
+            else:
+                entries.append((bit, None, (kwargs['payload'], template, kwargs['color'])))
+                is_static = False
+
+        fused = fuse_conditions(conditions, None if keys is None else sorted(keys)) if conditions else None
+        static_keyboard = self._build_keyboard({}, entries, fused) if is_static else None
+
+        # Renders may run in other threads, so the compiled parts are published together in a single assignment
+        compiled = self._compiled = entries, fused, static_keyboard
+        return compiled
+
+    @staticmethod
+    def _build_keyboard(payload: dict, entries: list, conditions: Optional[Callable[[dict], int]]) -> Keyboard:
+        mask = conditions(payload) if conditions is not None else 0
+
+        keyboard = Keyboard()
+        for bit, button, dynamic_button in entries:
+            if bit and not mask & bit:
+                continue
+
+            if button is not None:
+                keyboard.add_button(button)
+
+            elif dynamic_button is not None:
+                button_payload, template, color = dynamic_button
+                keyboard.add_button(KeyboardButton(button_payload, template.render(payload), color))
+
+            else:
+                keyboard.add_line()
+
+        return keyboard
+
     def get_message(self, payload: Optional[dict] = None) -> Message:
         if payload is None:
             payload = {}
 
-        keyboard = Keyboard()
-        for item in self.items:
-            if item.is_available(payload):
-                kwargs = item.get_content()
-
-                if kwargs['type'] == 'button':
-                    keyboard.add_button(KeyboardButton(
-                        kwargs['payload'],
-                        kwargs['text'].format(**payload),
-                        kwargs['color'],
-                    ))
+        compiled = self._compiled
+        if compiled is None:
+            compiled = self._compile()
 
-                elif kwargs['type'] == 'line_break':
-                    keyboard.add_line()
+        entries, conditions, keyboard = compiled
+        if keyboard is None:
+            keyboard = self._build_keyboard(payload, entries, conditions)
 
         return Message(self.content, keyboard, payload)
 
@@ -154,6 +299,9 @@ class Menu(BaseMenu):
         except AttributeError:
             raise RuntimeError('The menu\'s item list is immutable')
 
+        self._index_item(item)
+        self._compiled = None
+
     def serialize(self) -> dict:
         res = {
             **super().serialize(),
@@ -181,6 +329,8 @@ class Menu(BaseMenu):
 class CustomMenu(BaseMenu):
     """A menu that is controlled by a custom class.
 
+    The handler methods may be coroutine functions, in which case the menu must be used through its async methods.
+
     Args:
         handler: A class containing "select", "get_message" and "enter" methods.
         aliases: A sequence of strings that act as shortcuts to the menu.
@@ -201,9 +351,21 @@ class CustomMenu(BaseMenu):
 
         return res if isinstance(res, collections.abc.Sequence) else (res, )
 
+    async def select_async(self, action: str, payload: Optional[dict] = None) -> Optional[Sequence[Message]]:
+        res = self.handler.select(action, payload)
+        if inspect.isawaitable(res):
+            res = await res
+
+        return res if isinstance(res, collections.abc.Sequence) else (res, )
+
     def get_message(self, payload: Optional[dict] = None) -> Optional[Message]:
         return self.handler.get_message(payload)
 
+    async def get_message_async(self, payload: Optional[dict] = None) -> Optional[Message]:
+        res = self.handler.get_message(payload)
+
+        return await res if inspect.isawaitable(res) else res
+
     def serialize(self) -> dict:
         res = {
             **super().serialize(),
@@ -214,3 +376,8 @@ class CustomMenu(BaseMenu):
 
     def enter(self, payload: Optional[dict] = None) -> Optional[Message]:
         return self.handler.enter(payload)
+
+    async def enter_async(self, payload: Optional[dict] = None) -> Optional[Message]:
+        res = self.handler.enter(payload)
+
+        return await res if inspect.isawaitable(res) else res
@@ -2,6 +2,7 @@ from typing import Optional
 
 from .contents import BaseContent
 from .keyboard import Keyboard
+from .templates import compile_template
 
 
 class Message:
@@ -36,13 +37,20 @@ class Message:
 
         Returns:
             Formatted message content.
+
+        Raises:
+            KeyError: The payload does not contain a key required by the content.
         """
-        if self.content is None:
+        content = self.content
+        if content is None:
             return {}
 
-        return {k: (
-            self.content[k].format(**self.payload) if isinstance(self.content[k], str) else self.content[k]
-        ) for k in self.content.keys()}
+        res = {}
+        for k in content.keys():
+            value = content[k]
+            res[k] = compile_template(value).render(self.payload) if isinstance(value, str) else value
+
+        return res
 
     def update_payload(self, payload: dict) -> None:
         """Update the message payload.
@@ -52,6 +60,19 @@ class Message:
         """
         self.payload = payload
 
+    def with_payload(self, payload: dict) -> 'Message':
+        """Get a message with the same content and keyboard but another payload.
+
+        The content and keyboard are shared with this message, not copied.
+
+        Args:
+            payload: The payload of the new message.
+
+        Returns:
+            A new message.
+        """
+        return Message(self.content, self.keyboard, payload)
+
     def serialize(self) -> dict:
         """Serialize the class instance to a dictionary.
 
@@ -102,6 +123,20 @@ class Response:
         if self.message is not None:
             self.message.update_payload(payload)
 
+    def with_payload(self, payload: dict) -> 'Response':
+        """Get a response with the same target menu but the message bound to another payload.
+
+        Args:
+            payload: The payload of the new message.
+
+        Returns:
+            A new response.
+        """
+        if self.message is None:
+            return self
+
+        return Response(self.message.with_payload(payload), self.menu, self.go_back_count)
+
     def serialize(self) -> dict:
         """Serialize the class instance to a dictionary.
 
@@ -1,5 +1,85 @@
+import itertools
+import mmap
+import os
+import sqlite3
+import struct
+import sys
+import tempfile
+import threading
+import time
 from abc import ABC, abstractmethod
-from typing import Optional
+from array import array
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence
+
+_SNAPSHOT_MAGIC = b'NAVMENU\x01'
+_SNAPSHOT_HEADER = struct.Struct('<8scxxxxxxxQQQ')
+_SNAPSHOT_NONE_USER = -2 ** 63
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) // 8 * 8
+
+
+class StateTable:
+    """A table that assigns compact integer IDs to state names.
+
+    IDs are assigned in order of first use and never change, so they can be stored instead of names.
+
+    Args:
+        names: The names to assign IDs to.
+    """
+
+    __slots__ = 'names', 'ids'
+
+    #: The maximum number of names, so that IDs fit into unsigned 16-bit integers.
+    MAX_SIZE = 2 ** 16
+
+    def __init__(self, names: Sequence[str] = ()) -> None:
+        self.names = []
+        self.ids = {}
+
+        for name in names:
+            self.get_id(name)
+
+    def __repr__(self) -> str:
+        return f'StateTable({self.names})'
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def get_id(self, name: str) -> int:
+        """Get the ID of the name, assigning a new one if needed.
+
+        Args:
+            name: The state name.
+
+        Returns:
+            The state ID.
+
+        Raises:
+            ValueError: The table is full.
+        """
+        state_id = self.ids.get(name)
+        if state_id is None:
+            if len(self.names) >= self.MAX_SIZE:
+                raise ValueError(f'A state table can contain at most {self.MAX_SIZE} names')
+
+            state_id = self.ids[name] = len(self.names)
+            self.names.append(sys.intern(name))
+
+        return state_id
+
+    def get_name(self, state_id: int) -> str:
+        """Get the name by its ID.
+
+        Args:
+            state_id: The state ID.
+
+        Returns:
+            The state name.
+        """
+        return self.names[state_id]
 
 
 class StateHandler(ABC):
@@ -47,66 +127,778 @@ class StateHandler(ABC):
 
         Args:
             user_id: A value used to identify the user.
-            count: How many steps to go back.
+            count: How many steps to go back. -1 returns to the default state.
+        """
+        pass
+
+    def get_many(self, user_ids: Iterable[Optional[int]]) -> Dict[Optional[int], str]:
+        """Get the current states for several users.
+
+        The default implementation prefetches the users and then gets their states one by one.
+
+        Args:
+            user_ids: Values used to identify the users.
+
+        Returns:
+            A dictionary mapping users to their current states.
+        """
+        user_ids = list(user_ids)
+        self.prefetch(user_ids)
+
+        return {i: self.get(i) for i in user_ids}
+
+    def set_many(self, states: Mapping[Optional[int], str]) -> None:
+        """Set the current states for several users.
+
+        The default implementation prefetches the users and then sets their states one by one.
+
+        Args:
+            states: A dictionary mapping users to states to set.
+        """
+        self.prefetch(states)
+
+        for user_id, new_state in states.items():
+            self.set(user_id, new_state)
+
+    def create_many(self, user_ids: Iterable[Optional[int]]) -> List[Optional[int]]:
+        """Create the specified users that do not exist.
+
+        The default implementation prefetches the users and then creates them one by one.
+
+        Args:
+            user_ids: Values used to identify the users.
+
+        Returns:
+            A list of the users that were created.
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        self.prefetch(user_ids)
+
+        return [i for i in user_ids if self.create(i)]
+
+    def prefetch(self, user_ids: Iterable[Optional[int]]) -> None:
+        """Load the states of several users in one operation before they are processed.
+
+        The default implementation does nothing.
+
+        Args:
+            user_ids: Values used to identify the users.
+        """
+        pass
+
+    def flush(self) -> None:
+        """Save all pending changes in one operation.
+
+        The default implementation does nothing.
+        """
+        pass
+
+
+class AsyncStateHandler(ABC):
+    """A generic asynchronous menu state manager."""
+
+    __slots__ = ()
+
+    @abstractmethod
+    async def get(self, user_id: Optional[int]) -> str:
+        """Get the current state for specified user.
+
+        Args:
+            user_id: A value used to identify the user.
+
+        Returns:
+            The current state for specified user.
+        """
+        pass
+
+    @abstractmethod
+    async def set(self, user_id: Optional[int], new_state: str) -> None:
+        """Set the current state for specified user.
+
+        Args:
+            user_id: A value used to identify the user.
+            new_state: A state to set.
+        """
+        pass
+
+    @abstractmethod
+    async def create(self, user_id: Optional[int]) -> bool:
+        """If specified user does not exist, create them and return True.
+
+        Args:
+            user_id: A value used to identify the user.
+
+        Returns:
+            True if user was successfully created.
+        """
+        pass
+
+    @abstractmethod
+    async def go_back(self, user_id: Optional[int], count: Optional[int] = 1) -> None:
+        """Return to the one of previous states.
+
+        Args:
+            user_id: A value used to identify the user.
+            count: How many steps to go back. -1 returns to the default state.
         """
         pass
 
+    async def get_many(self, user_ids: Iterable[Optional[int]]) -> Dict[Optional[int], str]:
+        """Get the current states for several users.
+
+        The default implementation prefetches the users and then gets their states one by one.
+
+        Args:
+            user_ids: Values used to identify the users.
+
+        Returns:
+            A dictionary mapping users to their current states.
+        """
+        user_ids = list(user_ids)
+        await self.prefetch(user_ids)
+
+        return {i: await self.get(i) for i in user_ids}
+
+    async def set_many(self, states: Mapping[Optional[int], str]) -> None:
+        """Set the current states for several users.
+
+        The default implementation prefetches the users and then sets their states one by one.
+
+        Args:
+            states: A dictionary mapping users to states to set.
+        """
+        await self.prefetch(states)
+
+        for user_id, new_state in states.items():
+            await self.set(user_id, new_state)
+
+    async def create_many(self, user_ids: Iterable[Optional[int]]) -> List[Optional[int]]:
+        """Create the specified users that do not exist.
+
+        The default implementation prefetches the users and then creates them one by one.
+
+        Args:
+            user_ids: Values used to identify the users.
+
+        Returns:
+            A list of the users that were created.
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        await self.prefetch(user_ids)
+
+        return [i for i in user_ids if await self.create(i)]
+
+    async def prefetch(self, user_ids: Iterable[Optional[int]]) -> None:
+        """Load the states of several users in one operation before they are processed.
+
+        The default implementation does nothing.
+
+        Args:
+            user_ids: Values used to identify the users.
+        """
+        pass
+
+    async def flush(self) -> None:
+        """Save all pending changes in one operation.
+
+        The default implementation does nothing.
+        """
+        pass
+
+
+class AsyncStateHandlerAdapter(AsyncStateHandler):
+    """An asynchronous interface to a synchronous menu state manager.
+
+    Args:
+        state_handler: The synchronous state manager to wrap.
+    """
+
+    __slots__ = 'state_handler',
+
+    def __init__(self, state_handler: StateHandler) -> None:
+        self.state_handler = state_handler
+
+    def __repr__(self) -> str:
+        return f'AsyncStateHandlerAdapter({self.state_handler})'
+
+    @property
+    def state_table(self) -> Optional[StateTable]:
+        """The state table of the wrapped state manager, if any."""
+        return getattr(self.state_handler, 'state_table', None)
+
+    @property
+    def default_state(self) -> Optional[str]:
+        """The default state of the wrapped state manager, if any."""
+        return getattr(self.state_handler, 'default_state', None)
+
+    async def get(self, user_id: Optional[int]) -> str:
+        return self.state_handler.get(user_id)
+
+    async def set(self, user_id: Optional[int], new_state: str) -> None:
+        self.state_handler.set(user_id, new_state)
+
+    async def create(self, user_id: Optional[int]) -> bool:
+        return self.state_handler.create(user_id)
+
+    async def go_back(self, user_id: Optional[int], count: Optional[int] = 1) -> None:
+        self.state_handler.go_back(user_id, count)
+
+    async def get_many(self, user_ids: Iterable[Optional[int]]) -> Dict[Optional[int], str]:
+        return self.state_handler.get_many(user_ids)
+
+    async def set_many(self, states: Mapping[Optional[int], str]) -> None:
+        self.state_handler.set_many(states)
+
+    async def create_many(self, user_ids: Iterable[Optional[int]]) -> List[Optional[int]]:
+        return self.state_handler.create_many(user_ids)
+
+    async def prefetch(self, user_ids: Iterable[Optional[int]]) -> None:
+        self.state_handler.prefetch(user_ids)
+
+    async def flush(self) -> None:
+        self.state_handler.flush()
+
 
 class MemoryStateHandler(StateHandler):
     """A menu state manager that uses a dictionary to store data.
 
+    States are stored as integer IDs from :attr:`state_table`: ``state`` maps users to state IDs and ``history``
+    maps users to arrays of previous state IDs. Names are only used at the API edge.
+
+    Users evicted because of the limits below are treated like unknown users and get the default state.
+    Going back is O(count) and returning to the default state is O(1). With ``max_history``, up to twice as many
+    previous states are stored and the oldest ones are trimmed in bulk, so adding a state is amortized O(1).
+
     Args:
         default_state: The state that will be assigned to new users.
+        max_users: The maximum number of users to keep. The least recently used users are evicted first.
+        ttl: How many seconds an idle user is kept.
+        max_history: The maximum number of previous states to keep for each user.
+        state_table: The table of state IDs. May be shared with a :class:`~navmenu.menu_manager.MenuManager`.
     """
 
-    __slots__ = 'default_state', 'state', 'history'
+    __slots__ = (
+        'default_state', 'state', 'history', 'max_users', 'ttl', 'max_history', 'state_table',
+        '_default_id', '_last_access', '_lock',
+    )
+
+    def __init__(
+            self,
+            default_state: str,
+            max_users: Optional[int] = None,
+            ttl: Optional[float] = None,
+            max_history: Optional[int] = None,
+            state_table: Optional[StateTable] = None,
+    ) -> None:
+        if state_table is None:
+            state_table = StateTable()
 
-    def __init__(self, default_state: str) -> None:
         self.default_state = default_state
+        self.max_users = max_users
+        self.ttl = ttl
+        self.max_history = max_history
+        self.state_table = state_table
+
+        self._default_id = state_table.get_id(default_state)
 
         self.state = {}
         self.history = {}
+        self._last_access = OrderedDict()
+        self._lock = threading.Lock()
 
     def __repr__(self) -> str:
         return f'MemoryStateHandler({self.default_state})'
 
+    def _is_bounded(self) -> bool:
+        return self.max_users is not None or self.ttl is not None
+
+    def _evict(self, user_id: Optional[int]) -> None:
+        self.state.pop(user_id, None)
+        self.history.pop(user_id, None)
+        self._last_access.pop(user_id, None)
+
+    def _touch(self, user_id: Optional[int]) -> None:
+        if not self._is_bounded():
+            return
+
+        now = time.monotonic()
+
+        with self._lock:
+            if self.ttl is not None:
+                while self._last_access:
+                    oldest_user_id, oldest_access = next(iter(self._last_access.items()))
+                    if now - oldest_access <= self.ttl:
+                        break
+
+                    self._evict(oldest_user_id)
+
+            if user_id in self.state or user_id in self.history:
+                self._last_access[user_id] = now
+                self._last_access.move_to_end(user_id)
+
+    def _add_user(self, user_id: Optional[int]) -> None:
+        if not self._is_bounded():
+            return
+
+        with self._lock:
+            self._last_access[user_id] = time.monotonic()
+            self._last_access.move_to_end(user_id)
+
+            if self.max_users is not None:
+                while len(self._last_access) > self.max_users:
+                    self._evict(next(iter(self._last_access)))
+
     def get(self, user_id: Optional[int]) -> str:
-        if user_id not in self.state:
+        self._touch(user_id)
+
+        state_id = self.state.get(user_id)
+        if state_id is None:
             return self.default_state
 
-        return self.state[user_id]
+        return self.state_table.names[state_id]
+
+    def get_history(self, user_id: Optional[int]) -> List[str]:
+        """Get the previous states for specified user, from the oldest to the most recent.
+
+        Args:
+            user_id: A value used to identify the user.
+
+        Returns:
+            A list of previous states.
+        """
+        names = self.state_table.names
+        return [names[i] for i in self._get_recent_history(user_id)]
+
+    def _get_recent_history(self, user_id: Optional[int]) -> Sequence[int]:
+        history = self.history.get(user_id, ())
+        if self.max_history is not None and len(history) > self.max_history:
+            return history[len(history) - self.max_history:]
+
+        return history
+
+    def _push_history(self, user_id: Optional[int]) -> None:
+        history = self.history.get(user_id)
+        if history is None:
+            history = self.history[user_id] = array('H')
+
+        history.append(self.state.get(user_id, self._default_id))
+
+        # Removing the oldest entry on every push would be O(max_history), so the excess is removed at once
+        if self.max_history is not None and len(history) > 2 * self.max_history:
+            del history[:len(history) - self.max_history]
 
     def set(self, user_id: Optional[int], new_state: str) -> None:
-        if user_id not in self.history:
-            self.history[user_id] = []
+        self._touch(user_id)
 
-        self.history[user_id].append(self.state[user_id] if user_id in self.state else self.default_state)
-        self.state[user_id] = new_state
+        self._push_history(user_id)
+        self.state[user_id] = self.state_table.get_id(new_state)
+        self._add_user(user_id)
 
     def create(self, user_id: Optional[int]) -> bool:
+        self._touch(user_id)
+
         if user_id not in self.state:
-            self.state[user_id] = self.default_state
-            self.history[user_id] = []
+            self.state[user_id] = self._default_id
+            self._add_user(user_id)
 
             return True
 
+    def get_many(self, user_ids: Iterable[Optional[int]]) -> Dict[Optional[int], str]:
+        if self._is_bounded():
+            return {i: self.get(i) for i in user_ids}
+
+        names = self.state_table.names
+        get_state = self.state.get
+        default_id = self._default_id
+
+        return {i: names[get_state(i, default_id)] for i in user_ids}
+
+    def set_many(self, states: Mapping[Optional[int], str]) -> None:
+        if self._is_bounded():
+            for user_id, new_state in states.items():
+                self.set(user_id, new_state)
+
+            return
+
+        get_id = self.state_table.get_id
+        push_history = self._push_history
+
+        for user_id, new_state in states.items():
+            push_history(user_id)
+            self.state[user_id] = get_id(new_state)
+
+    def create_many(self, user_ids: Iterable[Optional[int]]) -> List[Optional[int]]:
+        if self._is_bounded():
+            return [i for i in dict.fromkeys(user_ids) if self.create(i)]
+
+        created = [i for i in dict.fromkeys(user_ids) if i not in self.state]
+        self.state.update(dict.fromkeys(created, self._default_id))
+
+        return created
+
     def go_back(self, user_id: Optional[int], count: Optional[int] = 1) -> None:
-        if count < 1:
+        if count != -1 and count < 1:
             raise ValueError('Count must be at least 1')
 
-        elif count == -1:
-            count = 1000
+        self._touch(user_id)
+
+        history = self.history.get(user_id)
+        if history is None:
+            if user_id in self.state:
+                self.state[user_id] = self._default_id
 
-        if user_id not in self.history:
             return
 
-        for i in range(count):
-            if len(self.history[user_id]) <= i + 1:
-                new_state = self.default_state
-                break
+        size = len(history) if self.max_history is None else min(len(history), self.max_history)
+        if count == -1 or count > size:
+            del history[:]
+            new_state = self._default_id
 
-            else:
-                new_state = self.history[user_id][-(i + 1)]
+        else:
+            new_state = history[-count]
+            del history[-count:]
 
         self.state[user_id] = new_state
-        self.history[user_id] = self.history[user_id][:-count]
+
+    def stats(self) -> dict:
+        """Get storage statistics.
+
+        Returns:
+            A dictionary with the number of stored users, history entries and the approximate memory usage in bytes.
+        """
+        if self.max_history is None:
+            history_size = sum(len(i) for i in self.history.values())
+        else:
+            history_size = sum(min(len(i), self.max_history) for i in self.history.values())
+        memory = (
+            sys.getsizeof(self.state) + sys.getsizeof(self.history) + sys.getsizeof(self._last_access)
+            + sum(sys.getsizeof(i) for i in self.history.values())
+        )
+
+        return {
+            'users': len(self.state),
+            'history_entries': history_size,
+            'memory': memory,
+        }
+
+    def dump(self, path: str) -> None:
+        """Save all states and history to a binary snapshot.
+
+        The file contains the state table and fixed-width arrays of user IDs, state IDs and history, so it can be
+        memory-mapped. User IDs must be integers or None. The snapshot is written to a temporary file that replaces
+        the previous one at once, so an interrupted dump leaves the previous snapshot intact.
+
+        Args:
+            path: The snapshot file path.
+
+        Raises:
+            ValueError: A user ID is not an integer.
+        """
+        try:
+            user_ids = array('q', (_SNAPSHOT_NONE_USER if i is None else i for i in self.state))
+        except (TypeError, OverflowError):
+            raise ValueError('Only integer user IDs can be saved to a snapshot') from None
+
+        states = array('H', self.state.values())
+        history_offsets = array('Q', (0, ))
+        history = array('H')
+
+        for user_id in self.state:
+            user_history = self._get_recent_history(user_id)
+            if user_history:
+                history.extend(user_history)
+
+            history_offsets.append(len(history))
+
+        encoded_names = [i.encode('utf-8') for i in self.state_table.names]
+        string_offsets = array('Q', (0, ))
+        for name in encoded_names:
+            string_offsets.append(string_offsets[-1] + len(name))
+
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(_SNAPSHOT_HEADER.pack(
+                    _SNAPSHOT_MAGIC, sys.byteorder[0].encode(), len(encoded_names), len(user_ids), len(history),
+                ))
+
+                for section in (string_offsets, user_ids, states, history_offsets, history):
+                    f.write(section.tobytes())
+                    f.write(b'\0' * (_align(f.tell()) - f.tell()))
+
+                f.write(b''.join(encoded_names))
+
+            os.replace(temp_path, path)
+
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def load(self, path: str) -> None:
+        """Replace all states and history with the ones from a binary snapshot created by :meth:`dump`.
+
+        Names from the snapshot are added to the state table, and IDs are remapped if the tables differ.
+
+        Args:
+            path: The snapshot file path.
+
+        Raises:
+            ValueError: The file is not a valid snapshot.
+        """
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            magic, byteorder, string_count, user_count, history_count = _SNAPSHOT_HEADER.unpack_from(buffer)
+            if magic != _SNAPSHOT_MAGIC:
+                raise ValueError('The file is not a navmenu state snapshot')
+
+            swap = byteorder != sys.byteorder[0].encode()
+            offset = _SNAPSHOT_HEADER.size
+
+            def read(typecode: str, count: int) -> array:
+                nonlocal offset
+
+                section = array(typecode)
+                section.frombytes(buffer[offset:offset + count * section.itemsize])
+                offset = _align(offset + count * section.itemsize)
+
+                if swap:
+                    section.byteswap()
+
+                return section
+
+            string_offsets = read('Q', string_count + 1)
+            user_ids = read('q', user_count).tolist()
+            states = read('H', user_count)
+            history_offsets = read('Q', user_count + 1)
+            history = read('H', history_count)
+
+            blob = buffer[offset:offset + string_offsets[-1]]
+
+        mapping = [
+            self.state_table.get_id(blob[start:end].decode('utf-8'))
+            for start, end in zip(string_offsets, string_offsets[1:])
+        ]
+        if mapping != list(range(len(mapping))):
+            states = array('H', map(mapping.__getitem__, states))
+            history = array('H', map(mapping.__getitem__, history))
+
+        if _SNAPSHOT_NONE_USER in user_ids:
+            user_ids = [None if i == _SNAPSHOT_NONE_USER else i for i in user_ids]
+
+        max_history = len(history) if self.max_history is None else self.max_history
+        self.state = dict(zip(user_ids, states))
+        self.history = {
+            user_id: history[max(start, end - max_history):end]
+            for user_id, start, end in zip(user_ids, history_offsets, itertools.islice(history_offsets, 1, None))
+            if start != end
+        }
+
+        with self._lock:
+            self._last_access = OrderedDict.fromkeys(user_ids, time.monotonic()) if self._is_bounded() else OrderedDict()
+
+            if self.max_users is not None:
+                while len(self._last_access) > self.max_users:
+                    self._evict(next(iter(self._last_access)))
+
+
+class SQLiteStateHandler(StateHandler):
+    """A menu state manager that stores data in an SQLite database.
+
+    Users are cached in memory after the first access. Writes are queued and committed in batches, so pending
+    changes must be saved with :meth:`flush` or :meth:`close` before the process exits.
+
+    Args:
+        default_state: The state that will be assigned to new users.
+        path: The database file path.
+        batch_size: How many queued writes trigger a commit.
+        flush_interval: How many seconds a write may stay queued before a commit is triggered by the next write.
+        cache_size: The maximum number of users to cache.
+    """
+
+    __slots__ = (
+        'default_state', 'path', 'batch_size', 'flush_interval', 'cache_size',
+        '_connection', '_lock', '_cache', '_pending', '_pending_since',
+    )
+
+    # SQLite limits the number of query parameters, 999 in older versions
+    _PREFETCH_CHUNK = 500
+
+    def __init__(
+            self,
+            default_state: str,
+            path: str = 'navmenu.sqlite3',
+            batch_size: int = 100,
+            flush_interval: float = 1.0,
+            cache_size: int = 10000,
+    ) -> None:
+        self.default_state = default_state
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.cache_size = cache_size
+
+        self._connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute('CREATE TABLE IF NOT EXISTS state (user_id PRIMARY KEY, state TEXT NOT NULL)')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS history ('
+            'user_id, position INTEGER NOT NULL, state TEXT NOT NULL, PRIMARY KEY (user_id, position))'
+        )
+
+        self._lock = threading.RLock()
+        self._cache = OrderedDict()
+        self._pending = []
+        self._pending_since = None
+
+    def __repr__(self) -> str:
+        return f'SQLiteStateHandler({self.default_state}, {repr(self.path)})'
+
+    def __enter__(self) -> 'SQLiteStateHandler':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    @staticmethod
+    def _key(user_id: Optional[int]):
+        # NULL values are distinct in SQLite primary keys, so the anonymous user is stored under an empty string
+        return '' if user_id is None else user_id
+
+    def _cache_entry(self, user_id: Optional[int], entry: Optional[list]) -> None:
+        self._cache[user_id] = entry
+        if len(self._cache) > self.cache_size:
+            # Evicted users are read from the database again, so queued writes must be saved first
+            self.flush()
+            self._cache.popitem(last=False)
+
+    def _load(self, user_id: Optional[int]) -> Optional[list]:
+        if user_id in self._cache:
+            self._cache.move_to_end(user_id)
+            return self._cache[user_id]
+
+        key = self._key(user_id)
+        row = self._connection.execute('SELECT state FROM state WHERE user_id = ?', (key, )).fetchone()
+
+        entry = None
+        if row is not None:
+            history = self._connection.execute(
+                'SELECT state FROM history WHERE user_id = ? ORDER BY position', (key, )
+            ).fetchall()
+            entry = [row[0], [i[0] for i in history]]
+
+        self._cache_entry(user_id, entry)
+        return entry
+
+    def _write(self, query: str, params: tuple) -> None:
+        if not self._pending:
+            self._pending_since = time.monotonic()
+
+        self._pending.append((query, params))
+
+        if len(self._pending) >= self.batch_size or time.monotonic() - self._pending_since >= self.flush_interval:
+            self.flush()
+
+    def get(self, user_id: Optional[int]) -> str:
+        with self._lock:
+            entry = self._load(user_id)
+
+            return self.default_state if entry is None else entry[0]
+
+    def set(self, user_id: Optional[int], new_state: str) -> None:
+        with self._lock:
+            entry = self._load(user_id)
+            if entry is None:
+                entry = self._cache[user_id] = [self.default_state, []]
+
+            key = self._key(user_id)
+            entry[1].append(entry[0])
+            entry[0] = new_state
+
+            self._write('INSERT OR REPLACE INTO history VALUES (?, ?, ?)', (key, len(entry[1]) - 1, entry[1][-1]))
+            self._write('INSERT OR REPLACE INTO state VALUES (?, ?)', (key, new_state))
+
+    def create(self, user_id: Optional[int]) -> bool:
+        with self._lock:
+            if self._load(user_id) is not None:
+                return False
+
+            self._cache[user_id] = [self.default_state, []]
+            self._write('INSERT OR REPLACE INTO state VALUES (?, ?)', (self._key(user_id), self.default_state))
+
+            return True
+
+    def go_back(self, user_id: Optional[int], count: Optional[int] = 1) -> None:
+        if count != -1 and count < 1:
+            raise ValueError('Count must be at least 1')
+
+        with self._lock:
+            entry = self._load(user_id)
+            if entry is None:
+                return
+
+            history = entry[1]
+            if count == -1 or count > len(history):
+                del history[:]
+                entry[0] = self.default_state
+
+            else:
+                entry[0] = history[-count]
+                del history[-count:]
+
+            key = self._key(user_id)
+            self._write('DELETE FROM history WHERE user_id = ? AND position >= ?', (key, len(history)))
+            self._write('INSERT OR REPLACE INTO state VALUES (?, ?)', (key, entry[0]))
+
+    def prefetch(self, user_ids: Iterable[Optional[int]]) -> None:
+        """Load uncached users with one query per table for every 500 users.
+
+        Args:
+            user_ids: Values used to identify the users.
+        """
+        with self._lock:
+            missing = [i for i in dict.fromkeys(user_ids) if i not in self._cache][-self.cache_size:]
+
+            for start in range(0, len(missing), self._PREFETCH_CHUNK):
+                chunk = missing[start:start + self._PREFETCH_CHUNK]
+                keys = {self._key(i): i for i in chunk}
+                placeholders = ', '.join('?' * len(keys))
+
+                entries = {k: [v, []] for k, v in self._connection.execute(
+                    f'SELECT user_id, state FROM state WHERE user_id IN ({placeholders})', tuple(keys),
+                )}
+                for key, state in self._connection.execute(
+                    f'SELECT user_id, state FROM history WHERE user_id IN ({placeholders}) ORDER BY position',
+                    tuple(keys),
+                ):
+                    if key in entries:
+                        entries[key][1].append(state)
+
+                for key, user_id in keys.items():
+                    self._cache_entry(user_id, entries.get(key))
+
+    def flush(self) -> None:
+        """Commit all queued writes in a single transaction."""
+        with self._lock:
+            if not self._pending:
+                return
+
+            pending = self._pending
+            self._pending = []
+            self._pending_since = None
+
+            self._connection.execute('BEGIN')
+            try:
+                for query, params in pending:
+                    self._connection.execute(query, params)
+
+            except BaseException:
+                self._connection.execute('ROLLBACK')
+                raise
+
+            self._connection.execute('COMMIT')
+
+    def close(self) -> None:
+        """Commit queued writes and close the database connection."""
+        with self._lock:
+            self.flush()
+            self._connection.close()
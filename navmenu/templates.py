@@ -0,0 +1,89 @@
+import functools
+import string
+from typing import FrozenSet, Optional
+
+_formatter = string.Formatter()
+
+
+def _parse_keys(text: str) -> FrozenSet[str]:
+    keys = set()
+
+    for _, field_name, format_spec, _ in _formatter.parse(text):
+        if field_name is None:
+            continue
+
+        key = field_name.partition('.')[0].partition('[')[0]
+        if key and not key.isdigit():
+            keys.add(key)
+
+        if format_spec:
+            keys |= _parse_keys(format_spec)
+
+    return frozenset(keys)
+
+
+class Template:
+    """A string template parsed once and rendered with a payload.
+
+    Args:
+        text: The template text in :meth:`str.format` syntax.
+
+    Attributes:
+        keys: The payload keys the template requires.
+        is_constant: Whether the template has no replacement fields.
+    """
+
+    __slots__ = 'text', 'keys', 'is_constant', '_constant_text'
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+        self.keys = _parse_keys(text)
+        self.is_constant = not any(field_name is not None for _, field_name, _, _ in _formatter.parse(text))
+
+        self._constant_text = text.format() if self.is_constant else None
+
+    def __repr__(self) -> str:
+        return f'Template({repr(self.text)})'
+
+    def render(self, payload: Optional[dict] = None) -> str:
+        """Render the template.
+
+        Args:
+            payload: A dictionary of values to substitute.
+
+        Returns:
+            The rendered text.
+
+        Raises:
+            KeyError: The payload does not contain a key required by the template.
+        """
+        if self.is_constant:
+            return self._constant_text
+
+        if payload is None:
+            payload = {}
+
+        try:
+            return self.text.format_map(payload)
+
+        except KeyError:
+            missing = sorted(self.keys.difference(payload))
+            if not missing:
+                raise
+
+            raise KeyError(
+                f'Template {repr(self.text)} requires missing payload keys: {", ".join(map(repr, missing))}'
+            ) from None
+
+
+@functools.lru_cache(maxsize=4096)
+def compile_template(text: str) -> Template:
+    """Parse the text into a template, reusing the result for equal texts.
+
+    Args:
+        text: The template text.
+
+    Returns:
+        A compiled template.
+    """
+    return Template(text)
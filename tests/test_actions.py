@@ -68,3 +68,37 @@ def test_function_action_with_templates():
 
     assert isinstance(res, Message)
     assert res.get_content().get('text') == 'ok'
+
+
+def test_execute_action_with_payload():
+    action = ExecuteAction('payload["user_id"] * 2', True)
+    res = action.process({'user_id': 21})
+
+    assert res.get_content().get('text') == '42'
+
+
+def test_safe_execute_action():
+    action = ExecuteAction('f"{len(payload)} {payload[\'user_id\'] + 1}"', True, safe=True)
+    res = action.process({'user_id': 1})
+
+    assert res.get_content().get('text') == '1 2'
+
+
+def test_safe_execute_action_with_invalid_command():
+    with pytest.raises(ValueError):
+        ExecuteAction('__import__("sys").exit()', True, safe=True)
+
+
+def test_function_action_does_not_modify_templates():
+    template = Response(Message(Content(text='user {user_id}')), menu='menu')
+    action = FunctionAction(lambda x: 'success', templates={
+        'success': template,
+    })
+
+    first = action.process({'user_id': 1})
+    second = action.process({'user_id': 2})
+
+    assert first.message.get_content().get('text') == 'user 1'
+    assert second.message.get_content().get('text') == 'user 2'
+    assert second.menu == 'menu'
+    assert template.message.payload == {}
@@ -0,0 +1,106 @@
+import json
+import sys
+
+import pytest
+
+from navmenu.bundle import compile_bundle, load_bundle
+from navmenu.responses import Message
+
+
+def greet(payload):
+    return Message()
+
+
+class Handler:
+    @staticmethod
+    def select(action, payload):
+        pass
+
+    @staticmethod
+    def get_message(payload):
+        return Message()
+
+    @staticmethod
+    def enter(payload):
+        pass
+
+
+MENUS = {
+    'menus': {
+        'main_menu': {
+            'type': 'Menu',
+            'content': {'type': 'Content', 'text': 'Main menu'},
+            'items': [
+                {
+                    'type': 'Item',
+                    'name': 'greet',
+                    'action': {'type': 'FunctionAction', 'function': 'greet'},
+                    'content': {'type': 'TextItemContent', 'text': 'greet'},
+                },
+                {
+                    'type': 'ConditionalItem',
+                    'name': 'calc',
+                    'action': {'type': 'ExecuteAction', 'command': '2 + 2', 'return_text': True},
+                    'content': {'type': 'TextItemContent', 'text': 'calculate'},
+                    'condition': 'lambda x: x.get("user_id") == 123',
+                },
+            ],
+        },
+        'custom': {
+            'type': 'CustomMenu',
+            'handler': 'Handler',
+        },
+    },
+}
+
+
+@pytest.fixture
+def source_path(tmp_path):
+    path = tmp_path / 'menu.json'
+    path.write_text(json.dumps(MENUS))
+
+    return str(path)
+
+
+def test_load_bundle(source_path):
+    module = sys.modules[__name__]
+    compiled = compile_bundle(source_path, function_container=module, custom_menu_handlers=(Handler, ))
+    menus = load_bundle(source_path, function_container=module, custom_menu_handlers=(Handler, ))
+
+    assert menus is not compiled
+    assert menus['main_menu'].items[0].action.function is greet
+    assert menus['custom'].handler is Handler
+
+    message = menus['main_menu'].get_message({'user_id': 123})
+    assert [i.text for i in message.keyboard.lines[0]] == ['greet', 'calculate']
+    assert next(menus['main_menu'].select('calc', {'user_id': 123})).get_content()['text'] == '4'
+
+
+def test_load_bundle_recompiles_changed_source(source_path):
+    module = sys.modules[__name__]
+    load_bundle(source_path, function_container=module, custom_menu_handlers=(Handler, ))
+
+    data = json.loads(json.dumps(MENUS))
+    data['menus']['main_menu']['content']['text'] = 'Changed menu'
+    with open(source_path, 'w') as f:
+        json.dump(data, f)
+
+    menus = load_bundle(source_path, function_container=module, custom_menu_handlers=(Handler, ))
+    assert menus['main_menu'].content.text == 'Changed menu'
+
+
+def test_load_bundle_recompiles_truncated_bundle(source_path):
+    module = sys.modules[__name__]
+    compile_bundle(source_path, function_container=module, custom_menu_handlers=(Handler, ))
+
+    bundle_path = source_path + '.bundle'
+    with open(bundle_path, 'rb') as f:
+        data = f.read()
+    with open(bundle_path, 'wb') as f:
+        f.write(data[:len(data) // 2])
+
+    menus = load_bundle(source_path, function_container=module, custom_menu_handlers=(Handler, ))
+    assert menus['main_menu'].content.text == 'Main menu'
+
+    with open(bundle_path, 'rb') as f:
+        assert f.read() == data
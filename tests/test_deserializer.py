@@ -0,0 +1,83 @@
+import pytest
+
+from navmenu.deserializer import LazyMenus, deserialize
+from navmenu.menu_manager import MenuManager
+from navmenu.menus import Menu
+from navmenu.contents import Content
+from navmenu.state import MemoryStateHandler
+
+DATA = {
+    'menus': {
+        'main_menu': {
+            'type': 'Menu',
+            'content': {'type': 'Content', 'text': 'Main menu'},
+            'items': [{
+                'type': 'Item',
+                'name': 'open',
+                'action': {'type': 'SubmenuAction', 'menu_name': 'submenu'},
+                'content': {'type': 'TextItemContent', 'text': 'open submenu'},
+            }],
+        },
+        'submenu': {
+            'type': 'Menu',
+            'content': {'type': 'Content', 'text': 'Submenu'},
+            'items': [{
+                'type': 'Item',
+                'name': 'back',
+                'action': {'type': 'GoBackAction'},
+                'content': {'type': 'TextItemContent', 'text': 'go back'},
+            }],
+        },
+        'help': {
+            'type': 'Menu',
+            'content': {'type': 'Content', 'text': 'Help'},
+            'aliases': ['help'],
+        },
+    },
+}
+
+
+def test_deserialize():
+    menus = deserialize(DATA)
+
+    assert set(menus) == {'main_menu', 'submenu', 'help'}
+    assert menus['main_menu'].items[0].action.menu_name == 'submenu'
+
+
+def test_lazy_menus():
+    menus = LazyMenus(DATA)
+    menu_manager = MenuManager(menus, MemoryStateHandler('main_menu'))
+
+    assert menus.loaded_count == 0
+
+    menu_manager.select('open', 123)
+    assert menu_manager.get_message(123).get_content()['text'] == 'Submenu'
+    assert menus.loaded_count == 2
+
+    menu_manager.select('HELP', 123)
+    assert menu_manager.get_message(123).get_content()['text'] == 'Help'
+
+
+def test_lazy_menus_eviction():
+    menus = LazyMenus(DATA, max_loaded=1)
+    main_menu = menus['main_menu']
+    menus['submenu']
+
+    assert menus.loaded_count == 1
+    assert menus['main_menu'] is not main_menu
+
+
+def test_lazy_menus_add_menu():
+    menus = LazyMenus(DATA, max_loaded=1)
+    menu_manager = MenuManager(menus, MemoryStateHandler('main_menu'))
+    menu = Menu(Content('New menu'), aliases=('new', ))
+    menu_manager.add_menu('new_menu', menu)
+
+    menus['main_menu']
+    menus['submenu']
+
+    assert menus['new_menu'] is menu
+    assert len(menus) == 4
+
+    with pytest.raises(ValueError):
+        menu_manager.add_menu('other_menu', Menu(Content('Other menu'), aliases=('help', )))
@@ -0,0 +1,64 @@
+import pytest
+
+from navmenu.expressions import compile_expression, fuse_conditions
+
+
+def test_compile_expression():
+    function = compile_expression('payload["a"] + max(payload["b"], 2) if payload else None')
+
+    assert function({'a': 1, 'b': 5}) == 6
+    assert function({}) is None
+
+
+def test_compile_expression_with_args():
+    assert compile_expression('x * y', ('x', 'y'))(2, 3) == 6
+
+
+@pytest.mark.parametrize('source', (
+    'payload.__class__',
+    'open("file")',
+    'payload["a"].upper()',
+    '[i for i in payload]',
+    'lambda: 1',
+    'x',
+))
+def test_compile_expression_with_disallowed_constructs(source):
+    with pytest.raises(ValueError):
+        compile_expression(source)
+
+
+def test_compile_expression_with_comment():
+    assert compile_expression('payload["a"]  # comment')({'a': 1}) == 1
+
+
+@pytest.mark.parametrize('source', ('"a" * 10 ** 10', '10 ** 10 ** 10', '1 << 10 ** 10', '[0] * 10 ** 7'))
+def test_compile_expression_with_too_large_result(source):
+    with pytest.raises(ValueError):
+        compile_expression(source)({})
+
+
+def test_fuse_conditions():
+    function = fuse_conditions((
+        'lambda x: x["role"] == "admin"',
+        'lambda y: y["role"] == "admin"',
+        'lambda x: [i for i in x if i == "beta"]',
+        lambda x: x['user_id'] == 123,
+    ))
+
+    assert function({'role': 'admin', 'user_id': 123}) == 0b1011
+    assert function({'role': 'user', 'beta': True, 'user_id': 456}) == 0b0100
+
+
+def test_fuse_conditions_with_keys():
+    calls = []
+
+    def condition(payload):
+        calls.append(payload)
+        return payload['role'] == 'admin'
+
+    function = fuse_conditions((condition, ), keys=('role', ))
+
+    assert function({'role': 'admin', 'user_id': 1}) == 1
+    assert function({'role': 'admin', 'user_id': 2}) == 1
+    assert function({'role': 'user'}) == 0
+    assert len(calls) == 2
@@ -0,0 +1,386 @@
+import json
+import queue
+import threading
+import time
+
+import pytest
+
+from navmenu.actions import FunctionAction, SubmenuAction
+from navmenu.contents import Content
+from navmenu.io import CallbackDataCodec, ConsoleIO, KeyboardCache, KeyboardTracker, KeyedDispatcher, TelegramIO, VKIO
+from navmenu.io.base import coalesce_messages
+from navmenu.io.telegram import TelegramMessage
+from navmenu.io.vk import VKMessage
+from navmenu.item_contents import TextItemContent
+from navmenu.items import Item
+from navmenu.keyboard import Keyboard, KeyboardButton
+from navmenu.menu_manager import MenuManager
+from navmenu.menus import Menu
+from navmenu.responses import Message, Response
+from navmenu.state import MemoryStateHandler
+
+
+@pytest.fixture
+def menu_manager():
+    return MenuManager({
+        'menu': Menu(Content('menu content'), (
+            Item('open', TextItemContent('open submenu'), SubmenuAction('submenu')),
+        )),
+        'submenu': Menu(Content('submenu content'), (
+            Item('open', TextItemContent('open menu'), SubmenuAction('menu')),
+        )),
+    }, MemoryStateHandler('menu'))
+
+
+def test_keyboard_cache():
+    cache = KeyboardCache(1)
+
+    assert cache.get(Keyboard([[KeyboardButton('a', 'A')]]), lambda x: 'a') == 'a'
+    assert cache.get(Keyboard([[KeyboardButton('a', 'A')]]), lambda x: 'b') == 'a'
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    cache.get(Keyboard([[KeyboardButton('b', 'B')]]), lambda x: 'b')
+    assert len(cache) == 1
+    assert cache.get(Keyboard([[KeyboardButton('a', 'A')]]), lambda x: 'c') == 'c'
+
+
+@pytest.mark.parametrize('io_class', (VKIO, TelegramIO))
+def test_io_keyboard_cache(menu_manager, io_class):
+    io = io_class(menu_manager)
+
+    first = io.process(123, 'start', {})
+    io.process(123, 'open', {})
+    last = io.process(123, 'open', {})
+
+    assert first[-1].text == last[-1].text == 'menu content'
+    assert first[-1].keyboard == last[-1].keyboard
+    assert io.keyboard_cache.hits == 1
+    assert io.keyboard_cache.misses == 2
+
+
+@pytest.mark.parametrize('message_class', (VKMessage, TelegramMessage))
+def test_message_rows_do_not_depend_on_cache(message_class):
+    keyboard = Keyboard([[KeyboardButton('a', 'A')]])
+    keyboard_cache = KeyboardCache(10)
+
+    first = message_class('', keyboard, keyboard_cache)
+    second = message_class('', keyboard, keyboard_cache)
+
+    assert len(first.rows) == 1
+    assert second.rows == first.rows
+    assert message_class('').rows == []
+
+
+def test_keyed_dispatcher_order():
+    results = []
+
+    def task(key, value):
+        time.sleep(0.001)
+        results.append((key, value))
+        return value
+
+    with KeyedDispatcher(4) as dispatcher:
+        futures = [dispatcher.submit(i % 3, task, i % 3, i) for i in range(30)]
+
+        assert [i.result() for i in futures] == list(range(30))
+
+    for key in range(3):
+        assert [v for k, v in results if k == key] == list(range(key, 30, 3))
+
+
+def test_keyed_dispatcher_backpressure():
+    event = threading.Event()
+
+    with KeyedDispatcher(1, max_pending=1) as dispatcher:
+        future = dispatcher.submit(1, event.wait)
+
+        with pytest.raises(queue.Full):
+            dispatcher.submit(2, event.wait, block=False)
+
+        event.set()
+        assert future.result()
+
+
+def test_keyed_dispatcher_exception():
+    with KeyedDispatcher() as dispatcher:
+        future = dispatcher.submit(1, int, 'invalid')
+
+        with pytest.raises(ValueError):
+            future.result()
+
+
+def test_callback_data_codec():
+    codec = CallbackDataCodec(maxsize=1)
+    long_payload = 'x' * 100
+
+    assert codec.encode('open') == '/open'
+    assert codec.decode('/open') == {'a': 'open'}
+    assert codec.decode('{"a":"open"}') == {'a': 'open'}
+
+    token = codec.encode(long_payload)
+    assert len(token) == 13
+    assert codec.decode(token) == {'a': long_payload}
+
+    codec.encode('y' * 100)
+    assert codec.decode(token) is None
+
+    assert codec.register(long_payload) == token
+    codec.encode('y' * 100)
+    assert codec.decode(token) == {'a': long_payload}
+
+
+def test_telegram_keyboards_with_expiring_tokens_are_not_cached():
+    codec = CallbackDataCodec(maxsize=1)
+    cache = KeyboardCache()
+    long_payload = 'x' * 100
+    keyboard = Keyboard([[KeyboardButton(long_payload, 'Long')]])
+
+    first = TelegramMessage('', keyboard, cache, codec)
+    codec.encode('y' * 100)
+    second = TelegramMessage('', keyboard, cache, codec)
+
+    callback_data = json.loads(second.keyboard)['inline_keyboard'][0][0]['callback_data']
+    assert codec.decode(callback_data) == {'a': long_payload}
+    assert len(cache) == 0
+
+    codec.register(long_payload)
+    TelegramMessage('', keyboard, cache, codec)
+    assert len(cache) == 1
+    assert first.keyboard == second.keyboard
+
+
+def test_telegram_compact_callback_data(menu_manager):
+    io = TelegramIO(menu_manager, compact_callback_data=True)
+
+    keyboard = json.loads(io.process(123, 'start', {})[-1].keyboard)
+    callback_data = keyboard['inline_keyboard'][0][0]['callback_data']
+    assert callback_data == '/open'
+
+    res = io.process(123, None, io.decode_callback_data(callback_data))
+    assert res[-1].text == 'submenu content'
+
+    res = io.process(123, None, io.decode_callback_data('#unknowntoken'))
+    assert res[-1].text == 'submenu content'
+
+
+@pytest.mark.parametrize('io_class', (VKIO, TelegramIO))
+def test_io_process_batch(menu_manager, io_class):
+    io = io_class(menu_manager)
+
+    res = io.process_batch([(1, 'start', {}), (2, 'start', {}), (1, 'open', {}), (1, 'invalid', {})])
+
+    assert [i[-1].text for i in res] == ['menu content', 'menu content', 'submenu content', 'Invalid command']
+
+
+@pytest.mark.parametrize('io_class', (VKIO, TelegramIO))
+def test_io_process_batch_return_exceptions(io_class):
+    def fail(payload):
+        raise RuntimeError('failed')
+
+    menu_manager = MenuManager({
+        'menu': Menu(Content('menu content'), (
+            Item('open', TextItemContent('open submenu'), SubmenuAction('submenu')),
+            Item('fail', TextItemContent('fail'), FunctionAction(fail)),
+        )),
+        'submenu': Menu(Content('submenu content'), (
+            Item('open', TextItemContent('open menu'), SubmenuAction('menu')),
+        )),
+    }, MemoryStateHandler('menu'))
+    io = io_class(menu_manager)
+
+    io.process_batch([(1, 'start', {}), (2, 'start', {})])
+
+    res = io.process_batch([(1, 'open', {}), (2, 'fail', {}), (3, 'start', {})], return_exceptions=True)
+
+    assert res[0][-1].text == 'submenu content'
+    assert isinstance(res[1], RuntimeError)
+    assert res[2][-1].text == 'menu content'
+    assert menu_manager.state_handler.get(1) == 'submenu'
+
+    with pytest.raises(RuntimeError):
+        io.process_batch([(1, 'open', {}), (2, 'fail', {})])
+
+
+def test_console_io_has_no_process_batch():
+    assert not hasattr(ConsoleIO, 'process_batch')
+
+
+class CountingStateHandler(MemoryStateHandler):
+    __slots__ = 'calls',
+
+    def __init__(self, default_state: str) -> None:
+        super().__init__(default_state)
+
+        self.calls = 0
+
+    def get(self, user_id):
+        self.calls += 1
+        return super().get(user_id)
+
+
+@pytest.mark.parametrize('io_class', (VKIO, TelegramIO))
+def test_io_reads_state_once(menu_manager, io_class):
+    state_handler = CountingStateHandler('menu')
+    io = io_class(MenuManager(menu_manager.menus, state_handler))
+    io.process(123, 'start', {})
+    state_handler.calls = 0
+
+    res = io.process(123, 'open', {})
+
+    assert res[-1].text == 'submenu content'
+    assert state_handler.calls == 1
+
+
+def test_coalesce_messages():
+    messages = [VKMessage('a'), VKMessage('b', Keyboard([[KeyboardButton('b', 'B')]])), VKMessage(''), VKMessage('c')]
+    keyboard = messages[1].keyboard
+
+    res = coalesce_messages(messages, ' | ')
+    assert [(i.text, i.keyboard) for i in res] == [('a | b | c', keyboard)]
+
+    res = coalesce_messages([VKMessage('a'), VKMessage('b'), VKMessage('c')], ' | ', max_length=5)
+    assert [i.text for i in res] == ['a | b', 'c']
+
+
+@pytest.mark.parametrize('io_class', (VKIO, TelegramIO))
+def test_io_coalesce(io_class):
+    menu_manager = MenuManager({
+        'menu': Menu(Content('menu content'), (
+            Item('open', TextItemContent('open submenu'), FunctionAction(
+                lambda payload: Response(Message(Content('opening')), menu='submenu'),
+            )),
+        )),
+        'submenu': Menu(Content('submenu content'), (
+            Item('back', TextItemContent('back'), SubmenuAction('menu')),
+        )),
+    }, MemoryStateHandler('menu'))
+    io = io_class(menu_manager, coalesce=True, separator='\n')
+    io.process(123, 'start', {})
+
+    res = io.process(123, 'open', {})
+
+    assert len(res) == 1
+    assert res[0].text == 'opening\nsubmenu content'
+    assert res[0].keyboard is not None
+
+
+def test_keyboard_tracker():
+    tracker = KeyboardTracker(1)
+
+    assert tracker.update(1, 'a')
+    assert not tracker.update(1, 'a')
+    assert tracker.update(2, 'a')
+    assert tracker.update(1, 'a')
+
+    tracker.forget(1)
+    assert tracker.update(1, 'a')
+
+
+@pytest.fixture
+def same_keyboard_menu_manager():
+    return MenuManager({
+        'menu': Menu(Content('menu content'), (
+            Item('open', TextItemContent('open'), SubmenuAction('submenu')),
+        )),
+        'submenu': Menu(Content('submenu content'), (
+            Item('open', TextItemContent('open'), SubmenuAction('other')),
+        )),
+        'other': Menu(Content('other content'), (
+            Item('back', TextItemContent('back'), SubmenuAction('menu')),
+        )),
+    }, MemoryStateHandler('menu'))
+
+
+def test_vk_skips_unchanged_keyboard(same_keyboard_menu_manager):
+    io = VKIO(same_keyboard_menu_manager, keyboard_tracker_size=10)
+
+    assert io.process(123, 'start', {})[-1].keyboard is not None
+    assert io.process(123, 'open', {})[-1].keyboard is None
+    assert io.process(123, 'open', {})[-1].keyboard is not None
+    assert io.process(456, 'start', {})[-1].keyboard is not None
+
+
+def test_vk_tracks_keyboards_per_peer(same_keyboard_menu_manager):
+    io = VKIO(same_keyboard_menu_manager, keyboard_tracker_size=10)
+
+    assert io.process(123, 'start', {}, peer_id=123)[-1].keyboard is not None
+    assert io.process(123, 'open', {}, peer_id=2000000001)[-1].keyboard is not None
+
+
+def test_telegram_edit_in_place(menu_manager):
+    io = TelegramIO(menu_manager, edit_in_place=True)
+    io.process(123, 'start', {})
+
+    res = io.process(123, 'open', {})
+    assert not res[-1].edit
+
+    res = io.process(123, None, {'a': 'open'})
+    assert res[-1].text == 'menu content'
+    assert res[-1].edit
+
+
+def test_telegram_edit_in_place_content_type_change(menu_manager):
+    class OtherContent(Content):
+        __slots__ = ()
+
+    menu_manager.menus['submenu'].content = OtherContent('submenu content')
+    io = TelegramIO(menu_manager, edit_in_place=True)
+    io.process(123, 'start', {})
+
+    res = io.process(123, None, {'a': 'open'})
+    assert res[-1].text == 'submenu content'
+    assert not res[-1].edit
+
+
+def test_keyed_dispatcher_shutdown_without_wait():
+    event = threading.Event()
+
+    dispatcher = KeyedDispatcher(1)
+    first = dispatcher.submit(1, event.wait)
+    second = dispatcher.submit(1, lambda: 'second')
+
+    dispatcher.shutdown(wait=False)
+    event.set()
+
+    assert first.result(timeout=2)
+    assert second.cancelled()
+
+    with pytest.raises(RuntimeError):
+        dispatcher.submit(1, lambda: None)
+
+
+class ShutdownBeforeResubmitExecutor:
+    """Shuts the dispatcher down while a worker is about to schedule the next task."""
+
+    def __init__(self, dispatcher):
+        self.dispatcher = dispatcher
+        self.executor = dispatcher._executor
+        self.calls = 0
+
+    def submit(self, *args, **kwargs):
+        self.calls += 1
+        if self.calls == 2:
+            threading.Thread(target=self.dispatcher.shutdown, kwargs={'wait': False}).start()
+            time.sleep(0.1)
+
+        return self.executor.submit(*args, **kwargs)
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait)
+
+
+def test_keyed_dispatcher_shutdown_during_resubmit():
+    event = threading.Event()
+
+    dispatcher = KeyedDispatcher(1, max_pending=10)
+    dispatcher._executor = ShutdownBeforeResubmitExecutor(dispatcher)
+    first = dispatcher.submit(1, event.wait)
+    second = dispatcher.submit(1, lambda: 'second')
+    event.set()
+
+    assert first.result(timeout=2)
+    assert second.result(timeout=2) == 'second'
+
+    dispatcher._executor.shutdown()
+    assert not dispatcher._queues
+    assert all(dispatcher._semaphore.acquire(False) for _ in range(10))
@@ -1,13 +1,17 @@
+import asyncio
+import types
+
 import pytest
 
-from navmenu.actions import MessageAction
+from navmenu.actions import FunctionAction, MessageAction
 from navmenu.contents import Content
+from navmenu.deserializer import LazyMenus, deserialize
 from navmenu.item_contents import TextItemContent
 from navmenu.items import Item
-from navmenu.menu_manager import MenuManager
-from navmenu.menus import Menu
+from navmenu.menu_manager import AsyncMenuManager, MenuManager
+from navmenu.menus import CustomMenu, Menu
 from navmenu.state import MemoryStateHandler
-from navmenu.responses import Message
+from navmenu.responses import Message, Response
 
 
 @pytest.fixture
@@ -58,3 +62,239 @@ def test_menu_with_alias(menu_manager):
 
     assert isinstance(message, Message)
     assert message.get_content().get('text') == 'menu with alias content'
+
+
+def test_menu_with_alias_case_insensitive(menu_manager):
+    menu_manager.select('ALIAS')
+
+    assert menu_manager.get_message().get_content().get('text') == 'menu with alias content'
+
+
+def test_add_menu_with_alias(menu_manager):
+    menu_manager.add_menu('new_menu', Menu(Content('new menu content'), aliases=('new', )))
+    menu_manager.select('new')
+
+    assert menu_manager.get_message().get_content().get('text') == 'new menu content'
+
+
+def test_duplicate_alias(menu_with_alias):
+    with pytest.raises(ValueError):
+        MenuManager({
+            'menu': Menu(Content('menu content'), aliases=('alias', )),
+            'menu_with_alias': menu_with_alias,
+        }, MemoryStateHandler('menu'))
+
+
+@pytest.fixture
+def run():
+    loop = asyncio.new_event_loop()
+    yield loop.run_until_complete
+    loop.close()
+
+
+@pytest.fixture
+def async_menu_manager(menu_with_alias):
+    async def func(payload):
+        return Response(Message(Content('user {user_id}')), menu='menu_with_alias')
+
+    class Handler:
+        @staticmethod
+        async def select(action, payload):
+            return Message(Content(f'custom {action}'))
+
+        @staticmethod
+        async def get_message(payload):
+            return Message(Content('custom menu'))
+
+        @staticmethod
+        def enter(payload):
+            pass
+
+    return AsyncMenuManager({
+        'menu': Menu(Content('menu content'), (
+            Item('func', TextItemContent('run function'), FunctionAction(func)),
+        )),
+        'menu_with_alias': menu_with_alias,
+        'custom': CustomMenu(Handler, aliases=('custom', )),
+    }, MemoryStateHandler('menu'))
+
+
+def test_async_select(async_menu_manager, run):
+    messages = run(async_menu_manager.select('func', 123, {'user_id': 123}))
+
+    assert [i.get_content().get('text') for i in messages] == ['user 123']
+
+    message = run(async_menu_manager.get_message(123))
+    assert message.get_content().get('text') == 'menu with alias content'
+
+
+def test_async_custom_menu(async_menu_manager, run):
+    run(async_menu_manager.select('custom', 123))
+    messages = run(async_menu_manager.select('hello', 123))
+
+    assert messages[0].get_content().get('text') == 'custom hello'
+    assert run(async_menu_manager.get_message(123)).get_content().get('text') == 'custom menu'
+
+
+def test_async_select_invalid_action(async_menu_manager, run):
+    with pytest.raises(ValueError):
+        run(async_menu_manager.select('invalid item'))
+
+
+def test_menu_ids(menu_manager):
+    state_table = menu_manager.state_handler.state_table
+
+    assert menu_manager.state_table is state_table
+    assert menu_manager.get_menu_id('menu') == state_table.get_id('menu')
+    assert menu_manager.get_menu_id('menu_with_alias') == state_table.get_id('menu_with_alias')
+
+
+@pytest.fixture
+def definitions():
+    return {'menus': {
+        'main': {'type': 'Menu', 'content': {'type': 'Content', 'text': 'main'}, 'items': [
+            {'type': 'Item', 'name': 'sub', 'content': {'type': 'TextItemContent', 'text': 'Sub'},
+             'action': {'type': 'SubmenuAction', 'menu_name': 'sub'}},
+        ]},
+        'sub': {'type': 'Menu', 'content': {'type': 'Content', 'text': 'sub'}, 'aliases': ['submenu']},
+    }}
+
+
+def test_reload(definitions):
+    menu_manager = MenuManager(deserialize(definitions), MemoryStateHandler('main'))
+    main = menu_manager.menus['main']
+
+    definitions['menus']['sub'] = {'type': 'Menu', 'content': {'type': 'Content', 'text': 'new sub'}, 'aliases': ['other']}
+    res = menu_manager.reload(definitions)
+
+    assert res == {'added': [], 'changed': ['sub'], 'removed': []}
+    assert menu_manager.menus['main'] is main
+    menu_manager.select('other')
+    assert menu_manager.get_message().get_content().get('text') == 'new sub'
+
+    with pytest.raises(ValueError):
+        menu_manager.select('submenu')
+
+
+def test_reload_lazy_rejects_invalid_definition(definitions):
+    menus = LazyMenus(definitions)
+    menu_manager = MenuManager(menus, MemoryStateHandler('main'))
+
+    invalid = {'menus': {**definitions['menus'], 'main': {**definitions['menus']['main'], 'type': 'Mnue'}}}
+    with pytest.raises(AttributeError):
+        menu_manager.reload(invalid)
+
+    assert menu_manager.menus is menus
+    assert menu_manager.get_message().get_content().get('text') == 'main'
+
+
+def test_reload_lazy_keeps_function_container(definitions):
+    container = types.SimpleNamespace(hello=lambda payload: Message(Content('hello')))
+    menu_manager = MenuManager(LazyMenus(definitions, container), MemoryStateHandler('main'))
+
+    definitions['menus']['main']['items'].append({
+        'type': 'Item', 'name': 'hello', 'content': {'type': 'TextItemContent', 'text': 'Hello'},
+        'action': {'type': 'FunctionAction', 'function': 'hello'},
+    })
+    menu_manager.reload(definitions)
+
+    assert menu_manager.select('hello')[0].get_content().get('text') == 'hello'
+
+
+@pytest.mark.parametrize('manager_class', (MenuManager, AsyncMenuManager))
+def test_reload_remaps_to_default_state(definitions, manager_class, run):
+    menu_manager = manager_class(deserialize(definitions), MemoryStateHandler('main'))
+    maybe_await = run if manager_class is AsyncMenuManager else lambda x: x
+
+    maybe_await(menu_manager.select('sub', 1))
+    menu_manager.reload({'menus': {'main': definitions['menus']['main']}})
+
+    message = maybe_await(menu_manager.get_message(1))
+    assert message.get_content().get('text') == 'main'
+
+
+def test_reload_remaps_deleted_menu(definitions):
+    menu_manager = MenuManager(LazyMenus(definitions), MemoryStateHandler('main'))
+    menu_manager.select('sub', 1)
+    main = menu_manager.menus['main']
+
+    new_definitions = {'menus': {
+        'main': definitions['menus']['main'],
+        'help': {'type': 'Menu', 'content': {'type': 'Content', 'text': 'help'}},
+    }}
+    res = menu_manager.reload(new_definitions, remap={'sub': 'help'})
+
+    assert res == {'added': ['help'], 'changed': [], 'removed': ['sub']}
+    assert menu_manager.menus['main'] is main
+    assert menu_manager.get_message(1).get_content().get('text') == 'help'
+    assert menu_manager.state_handler.get(1) == 'help'
+
+
+def test_reload_resolves_remap_chains(definitions):
+    menu_manager = MenuManager(deserialize(definitions), MemoryStateHandler('main'))
+    menu_manager.select('sub', 1)
+
+    help_definition = {'type': 'Menu', 'content': {'type': 'Content', 'text': 'help'}}
+    menu_manager.reload({'menus': {'main': definitions['menus']['main'], 'help': help_definition}}, remap={
+        'sub': 'help',
+    })
+    menu_manager.reload({'menus': {'main': definitions['menus']['main']}}, remap={'help': 'main'})
+
+    assert menu_manager.get_message(1).get_content().get('text') == 'main'
+    assert menu_manager.state_handler.get(1) == 'main'
+
+
+def test_reload_rejects_missing_remap_target(definitions):
+    menu_manager = MenuManager(deserialize(definitions), MemoryStateHandler('main'))
+    menus = menu_manager.menus
+
+    with pytest.raises(ValueError, match="'typo'"):
+        menu_manager.reload({'menus': {'main': definitions['menus']['main']}}, remap={'sub': 'typo'})
+
+    assert menu_manager.menus is menus
+
+
+@pytest.mark.parametrize('manager_class', (MenuManager, AsyncMenuManager))
+def test_compile(definitions, manager_class):
+    definitions['menus']['orphan'] = {'type': 'Menu', 'content': {'type': 'Content', 'text': 'orphan'}}
+    menu_manager = manager_class(deserialize(definitions), MemoryStateHandler('main'))
+
+    graph = menu_manager.compile()
+
+    assert menu_manager.graph is graph
+    assert graph.transitions == {'main': ('sub', ), 'sub': (), 'orphan': ()}
+    assert graph.root == 'main'
+    assert graph.unreachable == {'orphan'}
+    assert graph.depth == 1
+    assert graph.max_fan_out == 1
+
+
+def test_compile_dangling(definitions):
+    definitions['menus']['main']['items'][0]['action']['menu_name'] = 'typo'
+    menu_manager = MenuManager(deserialize(definitions), MemoryStateHandler('main'))
+
+    with pytest.raises(ValueError, match="'main' -> 'typo'"):
+        menu_manager.compile()
+
+
+def test_reload_rejects_dangling(definitions):
+    menu_manager = MenuManager(deserialize(definitions), MemoryStateHandler('main'))
+    menu_manager.compile()
+    menus = menu_manager.menus
+
+    with pytest.raises(ValueError):
+        menu_manager.reload({'menus': {'main': definitions['menus']['main']}})
+
+    assert menu_manager.menus is menus
+
+
+def test_select_many(menu_manager):
+    res = menu_manager.select_many([('alias', 1, None), ('invalid', 2, None), ('item', 1, None)], True)
+
+    assert not res[0]
+    assert isinstance(res[1], ValueError)
+    assert res[2][0].get_content().get('text') == 'message text'
+    assert menu_manager.state_handler.get(1) == 'menu_with_alias'
+
+    with pytest.raises(ValueError):
+        menu_manager.select_many([('invalid', 1, None)])
@@ -1,10 +1,11 @@
 import pytest
 import types
 
+import navmenu.menus
 from navmenu.actions import MessageAction
 from navmenu.contents import Content
 from navmenu.item_contents import TextItemContent
-from navmenu.items import Item
+from navmenu.items import ConditionalItem, Item
 from navmenu.menus import Menu
 from navmenu.responses import Message
 
@@ -110,3 +111,73 @@ def test_menu_add_item(empty_menu, menu_item_2):
 def test_menu_add_item_with_immutable_item_list(menu, menu_item_2):
     with pytest.raises(RuntimeError):
         menu.add_item(menu_item_2)
+
+
+def test_menu_select_added_item(empty_menu, menu_item_2):
+    empty_menu.add_item(menu_item_2)
+    message = next(empty_menu.select('hello'), None)
+
+    assert message.get_content().get('text') == 'Hello!'
+
+
+def test_menu_select_conditional_item():
+    menu = Menu(Content('menu content'), (
+        ConditionalItem('item', TextItemContent('admin'), MessageAction('admin'), 'lambda x: x["user_id"] == 123'),
+        Item('item', TextItemContent('user'), MessageAction('user')),
+    ))
+
+    assert next(menu.select('item', {'user_id': 123})).get_content().get('text') == 'admin'
+    assert next(menu.select('item', {'user_id': 456})).get_content().get('text') == 'user'
+
+
+def test_get_message_static_keyboard_is_reused(menu):
+    assert menu.get_message().keyboard is menu.get_message().keyboard
+
+
+def test_get_message_with_conditional_item():
+    menu = Menu(Content('menu content'), (
+        Item('item', TextItemContent('{{escaped}}')),
+        ConditionalItem('admin', TextItemContent('admin {user_id}'), None, 'lambda x: x["user_id"] == 123'),
+    ))
+
+    assert [i.text for i in menu.get_message({'user_id': 123}).keyboard.lines[0]] == ['{escaped}', 'admin 123']
+    assert [i.text for i in menu.get_message({'user_id': 456}).keyboard.lines[0]] == ['{escaped}']
+
+
+def test_get_message_during_compile(monkeypatch):
+    menu = Menu(Content('menu content'), (
+        Item('a', TextItemContent('A')),
+        ConditionalItem('admin', TextItemContent('Admin'), None, 'lambda x: x["user_id"] == 123'),
+    ))
+    menu.get_message({'user_id': 123})
+
+    renders = []
+    fuse_conditions = navmenu.menus.fuse_conditions
+
+    def render_while_compiling(*args, **kwargs):
+        renders.append([i.text for i in menu.get_message({'user_id': 123}).keyboard.lines[0]])
+        return fuse_conditions(*args, **kwargs)
+
+    monkeypatch.setattr(navmenu.menus, 'fuse_conditions', render_while_compiling)
+    menu.compile()
+
+    assert renders == [['A', 'Admin']]
+
+
+def test_get_message_after_add_item(menu_item_2):
+    menu = Menu(Content('menu content'), [])
+    menu.get_message()
+    menu.add_item(menu_item_2)
+
+    assert menu.get_message().keyboard.lines[0][0].text == 'say hello'
+
+
+def test_get_message_with_conditional_item_keys():
+    menu = Menu(Content('menu content'), (
+        ConditionalItem('admin', TextItemContent('admin'), None, 'lambda x: x["role"] == "admin"', keys=('role', )),
+        ConditionalItem('beta', TextItemContent('beta'), None, 'lambda x: x.get("beta")', keys=('beta', )),
+    ))
+
+    assert [i.text for i in menu.get_message({'role': 'admin'}).keyboard.lines[0]] == ['admin']
+    assert [i.text for i in menu.get_message({'role': 'user', 'beta': True}).keyboard.lines[0]] == ['beta']
+    assert menu.get_message({'role': 'user'}).keyboard.lines == []
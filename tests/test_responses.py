@@ -1,3 +1,5 @@
+import pytest
+
 from navmenu.contents import Content
 from navmenu.responses import Message
 
@@ -6,3 +8,19 @@ def test_message_with_payload():
     message = Message(Content(text='message {user_id}'), payload={'user_id': 123})
 
     assert message.get_content().get('text') == 'message 123'
+
+
+def test_message_with_missing_payload_key():
+    message = Message(Content(text='message {user_id}'))
+
+    with pytest.raises(KeyError, match='user_id'):
+        message.get_content()
+
+
+def test_message_with_payload_view():
+    message = Message(Content(text='message {user_id}'))
+    view = message.with_payload({'user_id': 123})
+
+    assert view.get_content().get('text') == 'message 123'
+    assert view.content is message.content
+    assert message.payload == {}
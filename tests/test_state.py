@@ -1,6 +1,7 @@
 import pytest
 
-from navmenu.state import MemoryStateHandler
+import navmenu.state as state_module
+from navmenu.state import MemoryStateHandler, SQLiteStateHandler, StateTable
 
 
 class TestMemoryStateHandler:
@@ -16,7 +17,7 @@ class TestMemoryStateHandler:
     def test_history(self, state_handler):
         state_handler.set(123, 'new_state')
 
-        assert state_handler.history == {123: ['default']}
+        assert state_handler.get_history(123) == ['default']
 
     def test_default_state(self, state_handler):
         assert state_handler.get(123) == 'default'
@@ -26,7 +27,7 @@ class TestMemoryStateHandler:
         state_handler.go_back(123)
 
         assert state_handler.get(123) == 'default'
-        assert state_handler.history == {123: []}
+        assert state_handler.get_history(123) == []
 
     def test_go_back_with_invalid_count(self, state_handler):
         state_handler.set(123, 'new_state')
@@ -34,6 +35,18 @@ class TestMemoryStateHandler:
         with pytest.raises(ValueError):
             state_handler.go_back(123, 0)
 
+    @pytest.mark.parametrize('max_users', (None, 10))
+    def test_bulk(self, max_users):
+        state_handler = MemoryStateHandler('default', max_users=max_users)
+
+        assert state_handler.create_many([1, 2, 1]) == [1, 2]
+        assert state_handler.create_many([2, 3]) == [3]
+
+        state_handler.set_many({1: 'first', 4: 'fourth'})
+
+        assert state_handler.get_many([1, 2, 4, 5]) == {1: 'first', 2: 'default', 4: 'fourth', 5: 'default'}
+        assert state_handler.get_history(1) == ['default']
+
     def test_create(self, state_handler):
         is_created = state_handler.create(123)
         assert is_created
@@ -41,3 +54,258 @@ class TestMemoryStateHandler:
 
         is_created = state_handler.create(123)
         assert not is_created
+
+    def test_max_users(self):
+        state_handler = MemoryStateHandler('default', max_users=2)
+        state_handler.set(1, 'first')
+        state_handler.set(2, 'second')
+        state_handler.get(1)
+        state_handler.set(3, 'third')
+
+        assert state_handler.get(1) == 'first'
+        assert state_handler.get(2) == 'default'
+        assert state_handler.get(3) == 'third'
+        assert 2 not in state_handler.history
+
+    def test_ttl(self, monkeypatch):
+        now = 1000.0
+        monkeypatch.setattr('time.monotonic', lambda: now)
+
+        state_handler = MemoryStateHandler('default', ttl=60)
+        state_handler.set(123, 'new_state')
+
+        now += 30
+        assert state_handler.get(123) == 'new_state'
+
+        now += 61
+        assert state_handler.get(123) == 'default'
+        assert state_handler.create(123)
+
+    def test_max_history(self):
+        state_handler = MemoryStateHandler('default', max_history=2)
+        for i in range(5):
+            state_handler.set(123, str(i))
+
+        assert state_handler.get_history(123) == ['2', '3']
+
+        state_handler.go_back(123, 2)
+        assert state_handler.get(123) == '2'
+
+    def test_max_history_is_trimmed_in_bulk(self):
+        state_handler = MemoryStateHandler('default', max_history=2)
+        for i in range(100):
+            state_handler.set(123, str(i))
+
+            assert len(state_handler.history[123]) <= 4
+
+        assert state_handler.get_history(123) == ['97', '98']
+        assert state_handler.stats()['history_entries'] == 2
+
+        state_handler.go_back(123, 3)
+        assert state_handler.get(123) == 'default'
+
+    def test_max_history_zero(self, tmp_path):
+        state_handler = MemoryStateHandler('default', max_history=0)
+        for i in range(10):
+            state_handler.set(123, str(i))
+
+        assert not state_handler.history[123]
+        assert state_handler.get_history(123) == []
+
+        unbounded = MemoryStateHandler('default')
+        for i in range(10):
+            unbounded.set(123, str(i))
+
+        path = str(tmp_path / 'snapshot')
+        unbounded.dump(path)
+        state_handler.load(path)
+        assert state_handler.get(123) == '9'
+        assert state_handler.get_history(123) == []
+        assert not state_handler.history.get(123)
+
+    def test_go_back_multiple(self, state_handler):
+        for i in range(3):
+            state_handler.set(123, str(i))
+
+        state_handler.go_back(123, 2)
+        assert state_handler.get(123) == '0'
+
+        state_handler.go_back(123, 5)
+        assert state_handler.get(123) == 'default'
+
+    def test_go_back_to_root(self, state_handler):
+        for i in range(3):
+            state_handler.set(123, str(i))
+
+        state_handler.go_back(123, -1)
+
+        assert state_handler.get(123) == 'default'
+        assert len(state_handler.history[123]) == 0
+
+    def test_stats(self, state_handler):
+        state_handler.set(123, 'new_state')
+        stats = state_handler.stats()
+
+        assert stats['users'] == 1
+        assert stats['history_entries'] == 1
+        assert stats['memory'] > 0
+
+
+class TestSQLiteStateHandler:
+    @pytest.fixture
+    def path(self, tmp_path):
+        return str(tmp_path / 'state.sqlite3')
+
+    @pytest.fixture
+    def state_handler(self, path):
+        with SQLiteStateHandler('default', path) as state_handler:
+            yield state_handler
+
+    def test_get_set(self, state_handler):
+        state_handler.set(123, 'new_state')
+
+        assert state_handler.get(123) == 'new_state'
+
+    def test_default_state(self, state_handler):
+        assert state_handler.get(123) == 'default'
+
+    def test_go_back(self, state_handler):
+        for i in range(3):
+            state_handler.set(123, str(i))
+
+        state_handler.go_back(123, 2)
+        assert state_handler.get(123) == '0'
+
+        state_handler.go_back(123, -1)
+        assert state_handler.get(123) == 'default'
+
+    def test_create(self, state_handler):
+        assert state_handler.create(123)
+        assert not state_handler.create(123)
+
+    def test_persistence(self, path):
+        with SQLiteStateHandler('default', path, batch_size=3) as state_handler:
+            for i in range(3):
+                state_handler.set(123, str(i))
+            state_handler.set(None, 'anonymous')
+            state_handler.go_back(123)
+
+        with SQLiteStateHandler('default', path) as state_handler:
+            assert state_handler.get(123) == '1'
+            assert state_handler.get(None) == 'anonymous'
+
+            state_handler.go_back(123)
+            assert state_handler.get(123) == '0'
+
+    def test_bulk(self, state_handler):
+        assert state_handler.create_many([1, 2]) == [1, 2]
+
+        state_handler.set_many({1: 'first', 3: 'third'})
+
+        assert state_handler.get_many([1, 2, 3]) == {1: 'first', 2: 'default', 3: 'third'}
+
+    def test_prefetch(self, path):
+        with SQLiteStateHandler('default', path) as state_handler:
+            state_handler.set(1, 'first')
+            state_handler.set(1, 'second')
+            state_handler.set(None, 'anonymous')
+
+        with SQLiteStateHandler('default', path) as state_handler:
+            state_handler.prefetch([1, None, 2])
+
+            assert len(state_handler._cache) == 3
+            assert state_handler.get(1) == 'second'
+            assert state_handler.get(None) == 'anonymous'
+            assert state_handler.get(2) == 'default'
+
+            state_handler.go_back(1)
+            assert state_handler.get(1) == 'first'
+
+
+class TestMemoryStateHandlerSnapshot:
+    def test_dump_load(self, tmp_path):
+        path = str(tmp_path / 'state.snapshot')
+
+        state_handler = MemoryStateHandler('default')
+        state_handler.create(1)
+        state_handler.set(2, 'first')
+        state_handler.set(2, 'second')
+        state_handler.set(None, 'ünicode')
+        state_handler.dump(path)
+
+        loaded = MemoryStateHandler('default')
+        loaded.load(path)
+
+        assert loaded.state == state_handler.state
+        assert loaded.get_history(2) == ['default', 'first']
+        assert 1 not in loaded.history
+
+        loaded.go_back(2)
+        assert loaded.get(2) == 'first'
+
+    def test_dump_keeps_previous_snapshot_on_failure(self, tmp_path, monkeypatch):
+        path = str(tmp_path / 'state.snapshot')
+
+        state_handler = MemoryStateHandler('default')
+        state_handler.set(1, 'first')
+        state_handler.dump(path)
+
+        def fail(*args):
+            raise OSError('disk full')
+
+        state_handler.set(1, 'second')
+        monkeypatch.setattr(state_module.os, 'replace', fail)
+        with pytest.raises(OSError):
+            state_handler.dump(path)
+        monkeypatch.undo()
+
+        loaded = MemoryStateHandler('default')
+        loaded.load(path)
+        assert loaded.get(1) == 'first'
+        assert [i.name for i in tmp_path.iterdir()] == ['state.snapshot']
+
+    def test_dump_invalid_user_id(self, tmp_path):
+        state_handler = MemoryStateHandler('default')
+        state_handler.set('user', 'state')
+
+        with pytest.raises(ValueError):
+            state_handler.dump(str(tmp_path / 'state.snapshot'))
+
+    def test_load_invalid_file(self, tmp_path):
+        path = tmp_path / 'state.snapshot'
+        path.write_bytes(b'\0' * 64)
+
+        with pytest.raises(ValueError):
+            MemoryStateHandler('default').load(str(path))
+
+
+def test_state_table():
+    state_table = StateTable(('first', 'second'))
+
+    assert state_table.get_id('second') == 1
+    assert state_table.get_id('third') == 2
+    assert state_table.get_name(2) == 'third'
+    assert len(state_table) == 3
+
+
+def test_memory_state_handler_stores_ids():
+    state_table = StateTable(('menu', 'submenu'))
+    state_handler = MemoryStateHandler('menu', state_table=state_table)
+    state_handler.set(123, 'submenu')
+
+    assert state_handler.state == {123: 1}
+    assert list(state_handler.history[123]) == [0]
+
+
+def test_snapshot_with_another_state_table(tmp_path):
+    path = str(tmp_path / 'state.snapshot')
+
+    state_handler = MemoryStateHandler('default')
+    state_handler.set(123, 'new_state')
+    state_handler.dump(path)
+
+    loaded = MemoryStateHandler('default', state_table=StateTable(('other', )))
+    loaded.load(path)
+
+    assert loaded.get(123) == 'new_state'
+    assert loaded.get_history(123) == ['default']
@@ -0,0 +1,31 @@
+import pytest
+
+from navmenu.templates import Template, compile_template
+
+
+def test_constant_template():
+    template = Template('text {{escaped}}')
+
+    assert template.is_constant
+    assert template.keys == frozenset()
+    assert template.render() == 'text {escaped}'
+
+
+def test_template_keys():
+    template = Template('{user[name]} {count:{width}} {text.upper}')
+
+    assert not template.is_constant
+    assert template.keys == {'user', 'count', 'width', 'text'}
+
+
+def test_template_render():
+    assert Template('user {user_id}').render({'user_id': 123}) == 'user 123'
+
+
+def test_template_missing_key():
+    with pytest.raises(KeyError, match='user_id'):
+        Template('user {user_id}').render({})
+
+
+def test_compile_template_is_cached():
+    assert compile_template('user {user_id}') is compile_template('user {user_id}')